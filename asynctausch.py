@@ -0,0 +1,247 @@
+from tausch import *
+from multiprocessing.pool import ThreadPool
+from threading import Event, Lock, RLock, Timer
+
+class RoundFuture(object):
+    """Class representing the eventual output of a TauschRouter round for one user"""
+    def __init__(self):
+        self._lock = Lock()
+        self._event = Event()
+        self._callbacks = list()
+        self._result = None
+        self._exception = None
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the round to complete and return the user's routed message
+        (a DamgaardJurikCiphertext instance). Raises the exception that caused
+        the round to fail, if any, or RuntimeError if the timeout expires.
+        """
+        if not self._event.wait(timeout):
+            raise RuntimeError('Timed out waiting for the round to complete')
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def add_done_callback(self, callback):
+        """Arrange for callback to be called with this future once it is done"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _set(self, result=None, exception=None):
+        with self._lock:
+            self._result = result
+            self._exception = exception
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, list()
+        for callback in callbacks:
+            callback(self)
+
+class AsyncTauschRouter(object):
+    """Class wrapping a TauschRouter so that submitters receive their routed
+    message asynchronously when the round completes
+
+    Modification notifications and the freezing of completed rounds are run in
+    order on a worker thread, and frozen rounds are routed on another, so
+    submitters never block on the homomorphic computation and the next round
+    can fill up while the previous one is being routed. If a deadline is given,
+    a round is routed that many seconds after its first submission even if
+    some users are absent; absent users contribute nothing.
+    """
+    def __init__(self, router=None, deadline=None, **router_args):
+        """router: (optional) the TauschRouter to wrap, by default a new one is
+            created from router_args
+        deadline: (optional) the number of seconds after the first submission
+            of a round at which absent users are timed out, default None, wait
+            for every user
+        """
+        self.router = router if router is not None else TauschRouter(**router_args)
+        self.deadline = deadline
+        self.lock = RLock()
+        self.worker = ThreadPool(1)
+        self.routing = ThreadPool(1)
+        self.futures = dict()
+        self.round = 0
+        self.timer = None
+        # submissions that arrive after a round is complete but before it has
+        # been frozen belong to the next round
+        self.closing = False
+        self.early = list()
+        # the futures of completed rounds waiting on the worker thread to be
+        # frozen, so that del_user can still fail a deleted user's submission
+        self.unfrozen = list()
+        # the exception raised by a modification callback since the last round
+        # was frozen, reported by the rounds that fail to freeze because of it
+        self.callback_error = None
+
+    def _start_round(self):
+        """Hand the completed round to the worker thread to be frozen"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            futures, self.futures = self.futures, dict()
+            self.round += 1
+            self.closing = True
+            self.unfrozen.append(futures)
+            self.worker.apply_async(self._freeze_round, (futures,))
+
+    def _freeze_round(self, futures):
+        """Freeze the completed round, hand it off to be routed, and then queue
+        the submissions for the next round that arrived in the meantime
+        """
+        with self.lock:
+            # rounds are frozen in the order they were started
+            self.unfrozen.pop(0)
+        try:
+            frozen = self.router.freeze_round()
+        except Exception as e:
+            with self.lock:
+                if self.callback_error is not None:
+                    e = self.callback_error
+            for future in futures.itervalues():
+                future._set(exception=e)
+        else:
+            with self.lock:
+                self.callback_error = None
+            self.routing.apply_async(self._route_round, (frozen, futures))
+        with self.lock:
+            self.closing = False
+            early, self.early = self.early, list()
+            for i, (user, message, future) in enumerate(early):
+                if self.closing:
+                    # these submissions completed another round, which must be
+                    # frozen before the rest can be queued
+                    self.early = early[i:] + self.early
+                    break
+                try:
+                    self._queue(user, message, future)
+                except Exception as e:
+                    future._set(exception=e)
+
+    def _route_round(self, frozen, futures):
+        try:
+            routed = frozen.route()
+        except Exception as e:
+            for future in futures.itervalues():
+                future._set(exception=e)
+        else:
+            for user, future in futures.iteritems():
+                if user in routed:
+                    future._set(result=routed[user])
+                else:
+                    # deleted after its round was handed to the worker thread
+                    future._set(exception=KeyError('User was deleted before the round completed'))
+
+    def _expire(self, round):
+        """Time out the users that haven't submitted a message and route the round"""
+        with self.lock:
+            if round != self.round:
+                return
+            self.timer = None
+            absent = 0 if self.router.slot_width is None else ()
+            for user in self.router.pending_users():
+                self.router.queue_message(user, absent)
+            if self.futures and self.router.ready:
+                self._start_round()
+
+    def _queue(self, user, message, future):
+        with self.lock:
+            ready = self.router.queue_message(user, message)
+            self.futures[user] = future
+            if ready:
+                self._start_round()
+            elif self.deadline is not None and self.timer is None:
+                self.timer = Timer(self.deadline, self._expire, (self.round,))
+                self.timer.daemon = True
+                self.timer.start()
+
+    def submit(self, user, message):
+        """Queue a message from the given user for the current round, returning
+        a RoundFuture for the user's routed message
+
+        Invalid submissions raise immediately, except while the previous round
+        is being frozen, in which case the error is set on the future.
+        """
+        with self.lock:
+            future = RoundFuture()
+            if self.closing:
+                self.early.append((user, message, future))
+            else:
+                self._queue(user, message, future)
+            return future
+
+
+    def _notifier(self, callback):
+        """Wrap a modification callback so that it is run on the worker thread,
+        after any rounds that were already started
+        """
+        def notify(add_del, user):
+            self.worker.apply_async(self._notify, (callback, add_del, user))
+        return notify
+
+    def _notify(self, callback, add_del, user):
+        """Run a modification callback on the worker thread. If it raises, the
+        subscriptions it should have updated are left incomplete, so the
+        exception is kept to fail the next round with, instead of the
+        unhelpful error from the router's consistency check.
+        """
+        try:
+            callback(add_del, user)
+        except Exception as e:
+            with self.lock:
+                self.callback_error = e
+
+    def add_user(self, user, callback):
+        """Add a new user to the router. The callback is notified asynchronously."""
+        self.router.add_user(user, self._notifier(callback))
+
+    def del_user(self, user):
+        """Delete a user from the router, failing their pending submission"""
+        with self.lock:
+            self.router.del_user(user)
+            for futures in [self.futures] + self.unfrozen:
+                future = futures.pop(user, None)
+                if future is not None:
+                    future._set(exception=KeyError('User was deleted before the round completed'))
+            if self.futures and not self.closing and self.router.ready:
+                self._start_round()
+
+    def update_subscription(self, user, subscription):
+        self.router.update_subscription(user, subscription)
+
+    def update_selectors(self, user, selectors):
+        self.router.update_selectors(user, selectors)
+
+    def required_s(self, user):
+        return self.router.required_s(user)
+
+    @property
+    def users(self):
+        return self.router.users
+
+    def flush(self):
+        """Wait for every round and notification started so far to complete"""
+        self.worker.apply(lambda: None)
+        self.routing.apply(lambda: None)
+
+    def close(self):
+        """Wait for the outstanding rounds and notifications, stop the worker
+        threads and close the router
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        self.worker.close()
+        self.worker.join()
+        self.routing.close()
+        self.routing.join()
+        self.router.close()
+
+__all__ = ['RoundFuture', 'AsyncTauschRouter']
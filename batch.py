@@ -0,0 +1,119 @@
+from damgaardjurik import *
+from intbytes import int2bytes
+from djcontext import get_context
+import keccak
+import multiprocessing
+import random as _random
+
+# the key and s of a pool worker process, set once per worker by _init_worker
+_worker_state = None
+
+def _init_worker(key, s):
+    global _worker_state
+    _worker_state = (key, s)
+
+def _encrypt_worker(args):
+    key, s = _worker_state
+    plaintext, seed = args
+    random = keccak.KeccakRandom(seed) if seed is not None else None
+    return int(key.encrypt(DamgaardJurikPlaintext(plaintext), s=s, random=random))
+
+def _decrypt_worker(ciphertext):
+    key, _ = _worker_state
+    return int(key.decrypt(DamgaardJurikCiphertext(ciphertext, key)))
+
+def _map(function, key, s, items, processes):
+    """Apply function to items in a pool of worker processes that each hold
+    key and s, returning the results in input order
+    """
+    workers = multiprocessing.Pool(processes, _init_worker, (key, s))
+    try:
+        chunksize = len(items) // (4 * (processes or multiprocessing.cpu_count())) + 1
+        return workers.map(function, items, chunksize)
+    finally:
+        workers.close()
+        workers.join()
+
+def blinding_factors(key, count, s=1, random=None, bigint=None):
+    """Return a list of count encryptions of zero under key and s, as
+    ciphertext values (integers)
+
+    An encryption of zero is a blinding factor r**(n**s) for a random r, and
+    every blinding factor has the same exponent and modulus, so they are
+    computed together with one powmod_list call of the big integer backend
+    under the shared djcontext context for n and s.
+
+    random: (optional) the source of the r, default a random.SystemRandom
+    bigint: (optional) the name of the big integer backend, default None,
+        the default backend
+    """
+    if random is None:
+        random = _random.SystemRandom()
+    context = get_context(key.n, s, bigint)
+    # r**(n**s) modulo n**(s+1) only depends on r modulo n
+    bases = [ random.randrange(1, key.n) for _ in xrange(count) ]
+    return [ int(blinding) for blinding in
+             context.backend.powmod_list(bases, context.n_powers[s], context.modulus) ]
+
+def encrypt_many(key, plaintexts, s=1, random=None, processes=None, pool=None, bigint=None):
+    """Encrypt each of plaintexts under key, returning a list of
+    DamgaardJurikCiphertext instances in the same order
+
+    key: the DamgaardJurik instance to encrypt under
+    plaintexts: an iterable of DamgaardJurikPlaintext instances or integers
+    s: (optional) the s to encrypt with, default 1
+    random: (optional) the source of randomness, default None (a
+        random.SystemRandom, or the key's default in worker processes).
+        Without processes or pool, the blinding factors of all of the
+        plaintexts are computed at once by blinding_factors, and each
+        plaintext is added to one homomorphically, so the output is
+        reproducible with the same random but differs from calling
+        key.encrypt in a loop.
+    processes: (optional) if given, encrypt in a pool of this many worker
+        processes (0 for one per CPU). If random is also given, each plaintext
+        is encrypted with a KeccakRandom seeded from it, so the output is
+        still reproducible, but differs from the sequential output.
+    pool: (optional) a blinding.BlindingPool for key and s to take
+        precomputed encryptions of zero from. Ignored if processes is given.
+        Raises ValueError if it is for a different key or s.
+    bigint: (optional) the name of the big integer backend used by
+        blinding_factors, default None, the default backend
+    """
+    if pool is not None and (pool.key is not key or pool.s != s):
+        raise ValueError('pool must be a BlindingPool for the same key and s')
+    plaintexts = [ int(plaintext) for plaintext in plaintexts ]
+    if processes is not None:
+        if random is not None:
+            seeds = [ int2bytes(random.getrandbits(256), 32) for _ in plaintexts ]
+        else:
+            seeds = [None] * len(plaintexts)
+        return [ DamgaardJurikCiphertext(ciphertext, key)
+                 for ciphertext in _map(_encrypt_worker, key, s, zip(plaintexts, seeds), processes or None) ]
+    if pool is not None:
+        return [ pool.encrypt(plaintext) for plaintext in plaintexts ]
+    return [ DamgaardJurikCiphertext(blinding, key) + plaintext
+             for blinding, plaintext in zip(blinding_factors(key, len(plaintexts), s, random, bigint),
+                                            plaintexts) ]
+
+def decrypt_many(key, ciphertexts, processes=None):
+    """Decrypt each of ciphertexts with key, returning a list of
+    DamgaardJurikPlaintext instances in the same order
+
+    key: the DamgaardJurik instance (with private key) to decrypt with
+    ciphertexts: an iterable of DamgaardJurikCiphertext instances
+    processes: (optional) if given, decrypt in a pool of this many worker
+        processes (0 for one per CPU)
+
+    Without processes this is just key.decrypt in a loop, no faster than
+    calling it directly: decryption needs the private key's arithmetic,
+    which lives in the damgaardjurik submodule, so there is no setup this
+    module can share between ciphertexts.
+    """
+    if processes is None:
+        return [ key.decrypt(ciphertext) for ciphertext in ciphertexts ]
+    return [ DamgaardJurikPlaintext(plaintext)
+             for plaintext in _map(_decrypt_worker, key, None,
+                                   [ int(ciphertext) for ciphertext in ciphertexts ],
+                                   processes or None) ]
+
+__all__ = ['blinding_factors', 'encrypt_many', 'decrypt_many']
@@ -0,0 +1,104 @@
+try:
+    import gmpy2
+    has_gmpy2 = True
+except ImportError:
+    has_gmpy2 = False
+
+class PythonBackend(object):
+    """Big integer arithmetic using Python's built in long integers"""
+    name = 'python'
+
+    @staticmethod
+    def mpz(i):
+        """Convert i to this backend's integer type"""
+        return i
+
+    @staticmethod
+    def powmod(base, exponent, modulus):
+        return pow(base, exponent, modulus)
+
+    @staticmethod
+    def invert(a, modulus):
+        """Compute the multiplicative inverse of a modulo modulus
+        Raises ValueError if a is not invertible
+        """
+        r0, r1 = a % modulus, modulus
+        s0, s1 = 1, 0
+        while r1:
+            quotient = r0 // r1
+            r0, r1 = r1, r0 - quotient*r1
+            s0, s1 = s1, s0 - quotient*s1
+        if r0 != 1:
+            raise ValueError('Argument a is not invertible modulo modulus')
+        return s0 % modulus
+
+    @classmethod
+    def powmod_list(cls, bases, exponent, modulus):
+        """Compute base**exponent modulo modulus for each of bases"""
+        return [ cls.powmod(base, exponent, modulus) for base in bases ]
+
+class Gmpy2Backend(PythonBackend):
+    """Big integer arithmetic using gmpy2's mpz type"""
+    name = 'gmpy2'
+
+    @staticmethod
+    def mpz(i):
+        return gmpy2.mpz(i)
+
+    @staticmethod
+    def powmod(base, exponent, modulus):
+        return gmpy2.powmod(base, exponent, modulus)
+
+    @staticmethod
+    def invert(a, modulus):
+        try:
+            retval = gmpy2.invert(a, modulus)
+        except ZeroDivisionError:
+            retval = 0
+        if not retval:
+            raise ValueError('Argument a is not invertible modulo modulus')
+        return retval
+
+    @classmethod
+    def powmod_list(cls, bases, exponent, modulus):
+        if hasattr(gmpy2, 'powmod_base_list'):
+            return gmpy2.powmod_base_list(bases, exponent, modulus)
+        return super(Gmpy2Backend, cls).powmod_list(bases, exponent, modulus)
+
+bigint_backends = { 'python':PythonBackend }
+if has_gmpy2:
+    bigint_backends['gmpy2'] = Gmpy2Backend
+
+# the name of the backend used when none is specified
+default_backend = 'gmpy2' if has_gmpy2 else 'python'
+
+def get_backend(name=None):
+    """Return the backend with the given name (a key of bigint_backends), or
+    the default backend if name is None. 'auto' is gmpy2 if it is installed
+    and python otherwise.
+    """
+    if name is None:
+        name = default_backend
+    elif name == 'auto':
+        name = 'gmpy2' if has_gmpy2 else 'python'
+    try:
+        return bigint_backends[name]
+    except KeyError:
+        raise ValueError('Unknown or unavailable big integer backend %s' % repr(name))
+
+def set_default_backend(name):
+    """Select the backend used when none is specified"""
+    global default_backend
+    default_backend = get_backend(name).name
+
+def active_backends():
+    """Report which big integer arithmetic is in use, as a dict with the
+    default backend of this module and whether the damgaardjurik module is
+    using gmpy
+    """
+    import damgaardjurik
+    return { 'bigint':default_backend,
+             'damgaardjurik':'gmpy' if damgaardjurik.has_gmpy else 'python' }
+
+__all__ = ['has_gmpy2', 'bigint_backends', 'get_backend', 'set_default_backend',
+           'active_backends']
@@ -0,0 +1,152 @@
+from damgaardjurik import *
+from intbytes import int2bytes
+from collections import deque
+import keccak
+import multiprocessing
+import os
+from threading import Condition, Lock, Thread
+
+# the key, s and randomness of a pool worker process, set once per worker by
+# _init_worker
+_worker_state = None
+
+def _init_worker(key, s):
+    global _worker_state
+    # seed every worker separately, rather than relying on the key's default
+    # randomness not having been copied by fork
+    _worker_state = (key, s, keccak.KeccakRandom(os.urandom(32)))
+
+def _encrypt_zero(seed):
+    key, s, random = _worker_state
+    if seed is not None:
+        random = keccak.KeccakRandom(seed)
+    return int(key.encrypt(DamgaardJurikPlaintext(0), s=s, random=random))
+
+class BlindingPool(object):
+    """Class representing a pool of precomputed encryptions of zero under a key
+
+    Almost all of the cost of DamgaardJurik.encrypt is the blinding factor
+    r**(n**s), which doesn't depend on the plaintext. An encryption of zero is
+    just such a blinding factor, so the pool computes them ahead of time and
+    encrypt turns one into an encryption of the plaintext by homomorphically
+    adding the plaintext to it. Each encryption of zero is used only once.
+
+    When the pool runs empty, encrypt falls back to DamgaardJurik.encrypt.
+    """
+    def __init__(self, key, s=1, depth=64, low_water=16, random=None, background=True, processes=None):
+        """key: the DamgaardJurik instance to encrypt under
+        s: (optional) the s to encrypt with, default 1
+        depth: (optional) the number of encryptions of zero to hold, default 64
+        low_water: (optional) refill the pool when it holds fewer than this
+            many encryptions of zero, default 16
+        random: (optional) the source of randomness passed to
+            DamgaardJurik.encrypt, default None (the key's default)
+        background: (optional) refill the pool in a background thread, default
+            True. For reproducible output (e.g. with a KeccakRandom for test
+            vectors) pass False and call fill explicitly.
+        processes: (optional) if given, the background thread computes the
+            encryptions of zero in a pool of this many worker processes. Each
+            encryption uses a KeccakRandom seeded from random if it is given,
+            or else from os.urandom. Ignored if background is False.
+        """
+        if not 0 <= low_water <= depth:
+            raise ValueError('low_water must be between 0 and depth')
+        self.key = key
+        self.s = s
+        self.depth = depth
+        self.low_water = low_water
+        self.random = random
+        # KeccakRandom is not thread safe, so uses of random are serialized
+        self.random_lock = Lock()
+        self.condition = Condition()
+        with self.condition:
+            self.pool = deque()
+            self.closed = False
+        self.processes = processes
+        self.thread = None
+        if background:
+            self.thread = Thread(target=self._refill)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def _encrypt_zero(self):
+        with self.random_lock:
+            return self.key.encrypt(DamgaardJurikPlaintext(0), s=self.s, random=self.random)
+
+    def fill(self, count=None):
+        """Synchronously add count encryptions of zero to the pool, by default
+        enough to fill it to depth
+        """
+        if count is None:
+            with self.condition:
+                count = self.depth - len(self.pool)
+        for _ in xrange(count):
+            blinding = self._encrypt_zero()
+            with self.condition:
+                self.pool.append(blinding)
+
+    def _refill(self):
+        """Body of the background thread"""
+        workers = None
+        if self.processes is not None:
+            workers = multiprocessing.Pool(self.processes, _init_worker, (self.key, self.s))
+        try:
+            while True:
+                with self.condition:
+                    while not self.closed and len(self.pool) >= self.low_water:
+                        self.condition.wait()
+                    if self.closed:
+                        return
+                    count = self.depth - len(self.pool)
+                if workers is None:
+                    self.fill(count)
+                else:
+                    if self.random is not None:
+                        with self.random_lock:
+                            seeds = [ int2bytes(self.random.getrandbits(256), 32) for _ in xrange(count) ]
+                    else:
+                        seeds = [None] * count
+                    for blinding in workers.imap_unordered(_encrypt_zero, seeds):
+                        blinding = DamgaardJurikCiphertext(blinding, self.key)
+                        with self.condition:
+                            self.pool.append(blinding)
+        finally:
+            if workers is not None:
+                workers.terminate()
+                workers.join()
+
+    def take(self):
+        """Remove and return an encryption of zero from the pool, or None if the
+        pool is empty
+        """
+        with self.condition:
+            retval = self.pool.popleft() if self.pool else None
+            if len(self.pool) < self.low_water:
+                self.condition.notify()
+            return retval
+
+    def encrypt(self, plaintext):
+        """Encrypt plaintext (a DamgaardJurikPlaintext instance or an integer)
+        under the key, returning a DamgaardJurikCiphertext instance
+        """
+        blinding = self.take()
+        if blinding is None:
+            if not isinstance(plaintext, DamgaardJurikPlaintext):
+                plaintext = DamgaardJurikPlaintext(plaintext)
+            with self.random_lock:
+                return self.key.encrypt(plaintext, s=self.s, random=self.random)
+        return blinding + int(plaintext)
+
+    def __len__(self):
+        with self.condition:
+            return len(self.pool)
+
+    def close(self):
+        """Stop the background thread, if any"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+__all__ = ['BlindingPool']
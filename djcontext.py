@@ -0,0 +1,103 @@
+from bigint import get_backend
+from collections import OrderedDict
+from threading import Lock
+
+class CiphertextContext(object):
+    """Class holding the constants for arithmetic on Damgaard-Jurik ciphertext
+    values (integers) under one public modulus n and one s. A single context
+    is shared by every ciphertext under that key and s (see get_context), so
+    the powers of n are computed once rather than for every operation.
+    """
+    def __init__(self, n, s=1, backend=None):
+        """n: the public modulus of the key
+        s: (optional) the ciphertexts are modulo n**(s+1), default 1
+        backend: (optional) the name of the big integer backend to compute
+            with, default None, the default backend
+        """
+        if s < 1:
+            raise ValueError('s must be positive')
+        self.n = n
+        self.s = s
+        self.backend = get_backend(backend)
+        powers = [1]
+        for _ in xrange(s + 1):
+            powers.append(powers[-1] * n)
+        # n**0 through n**(s+1)
+        self.n_powers = tuple(powers)
+        self.modulus = powers[-1]
+        self.width = (self.modulus.bit_length() + 7) // 8
+        self._modulus = self.backend.mpz(self.modulus)
+
+    def add(self, a, b):
+        """Homomorphically add the ciphertext values a and b"""
+        return int(self.backend.mpz(a) * b % self._modulus)
+
+    def negate(self, a):
+        """Homomorphically negate the ciphertext value a"""
+        return int(self.backend.invert(a, self._modulus))
+
+    def multiply(self, a, k):
+        """Homomorphically multiply the ciphertext value a by the integer k"""
+        if k < 0:
+            a, k = self.negate(a), -k
+        return int(self.backend.powmod(a, k, self._modulus))
+
+# the most recently used contexts, keyed by (n, s, backend name)
+max_contexts = 4096
+_contexts = OrderedDict()
+_contexts_lock = Lock()
+
+def get_context(n, s=1, backend=None):
+    """Return the shared CiphertextContext for the given n, s and backend"""
+    backend = get_backend(backend).name
+    key = (n, s, backend)
+    with _contexts_lock:
+        context = _contexts.pop(key, None)
+        if context is None:
+            context = CiphertextContext(n, s, backend)
+        _contexts[key] = context
+        while len(_contexts) > max_contexts:
+            _contexts.popitem(last=False)
+        return context
+
+def reset_contexts():
+    """Forget every shared context and replace the lock that guards them. A
+    process forked while another thread held that lock inherits it locked,
+    so worker processes call this before using any contexts.
+    """
+    global _contexts, _contexts_lock
+    _contexts = OrderedDict()
+    _contexts_lock = Lock()
+
+def context_for(n, values, backend=None):
+    """Given a public modulus and some ciphertext values (integers) under it,
+    return the shared context for the smallest s that can hold all of them
+    """
+    # a ciphertext modulo n**(s+1) is less than n**s with negligible probability
+    top = max(values) if values else 0
+    s = 1
+    while True:
+        context = get_context(n, s, backend)
+        if top < context.modulus:
+            return context
+        s += 1
+
+def minimal_s(n, bound):
+    """Return the smallest s whose plaintext space under the public modulus n
+    holds every non-negative integer less than bound. Plaintexts of n**s/2 or
+    more would decrypt as negative, so that is the largest usable bound.
+    """
+    s = 1
+    while bound > get_context(n, s).n_powers[s] // 2:
+        s += 1
+    return s
+
+def routed_bound(message_bits, senders, selector_bound=2):
+    """Return the (exclusive) bound on a routed sum: the contributions of the
+    given number of senders, each a message of at most message_bits bits
+    times a selector plaintext less than selector_bound (2 for 0/1 selectors)
+    """
+    return senders * (selector_bound - 1) * ((1 << message_bits) - 1) + 1
+
+__all__ = ['CiphertextContext', 'get_context', 'reset_contexts', 'context_for', 'minimal_s',
+           'routed_bound']
@@ -0,0 +1,150 @@
+from damgaardjurik import *
+from djcontext import context_for, minimal_s
+from intbytes import int2bytes, bytes2int
+import keccak
+import random as _random
+
+hybrid_magic = 'THYB\x00\x01'
+# the length of the key ciphertext width field
+hybrid_width_width = 4
+symmetric_key_length = 64
+nonce_length = 16
+
+class HybridEncryptor(object):
+    """Class representing the encryption of a stream of bytes to the holder of a
+    DamgaardJurik key
+
+    A fresh symmetric key is Damgaard-Jurik encrypted once, in the header, and
+    the payload is encrypted and authenticated with a keccak.KeccakCipher
+    under that key, so payloads of any length are encrypted at the speed of
+    the symmetric cipher, in constant memory.
+    """
+    def __init__(self, key, random=None):
+        """key: the DamgaardJurik instance of the recipient
+        random: (optional) the source of randomness for the symmetric key, the
+            nonce and the public key encryption, default None, the system's
+            secure random number generator
+        """
+        if random is None:
+            random = _random.SystemRandom()
+        symmetric_key = int2bytes(random.getrandbits(8*symmetric_key_length), symmetric_key_length)
+        nonce = int2bytes(random.getrandbits(8*nonce_length), nonce_length)
+        s = minimal_s(key.n, 1 << (8*symmetric_key_length))
+        encrypted_key = int(key.encrypt(DamgaardJurikPlaintext(bytes2int(symmetric_key)), s=s, random=random))
+        width = context_for(key.n, [encrypted_key]).width
+        self.header = ''.join([hybrid_magic,
+                               int2bytes(width, hybrid_width_width),
+                               int2bytes(encrypted_key, width),
+                               nonce])
+        self.cipher = keccak.KeccakCipher(symmetric_key, nonce, encrypt_not_decrypt=True)
+        self.started = False
+
+    def encrypt(self, data):
+        """Encrypt a chunk of the payload, returning the next chunk of output"""
+        if not self.started:
+            self.started = True
+            return self.header + self.cipher.encrypt(data)
+        return self.cipher.encrypt(data)
+
+    def finish(self):
+        """Return the last chunk of output, which authenticates the payload"""
+        return self.encrypt('') + self.cipher.emit_mac()
+
+class HybridDecryptor(object):
+    """Class representing the decryption of a stream written by HybridEncryptor
+
+    Plaintext is returned as it is decrypted, before the payload has been
+    authenticated. It must not be trusted until finish has returned.
+    """
+    def __init__(self, key):
+        """key: the DamgaardJurik instance, with private key, of the recipient"""
+        self.key = key
+        self.buffer = ''
+        self.cipher = None
+
+    def _parse_header(self):
+        """Try to parse the header out of the buffered input, returning whether
+        it was complete
+        """
+        offset = len(hybrid_magic)
+        if len(self.buffer) < offset + hybrid_width_width:
+            return False
+        if self.buffer[:offset] != hybrid_magic:
+            raise ValueError('Not a hybrid encrypted stream')
+        width = bytes2int(self.buffer[offset:offset+hybrid_width_width])
+        offset += hybrid_width_width
+        if len(self.buffer) < offset + width + nonce_length:
+            return False
+        encrypted_key = DamgaardJurikCiphertext(bytes2int(self.buffer[offset:offset+width]), self.key)
+        offset += width
+        nonce = self.buffer[offset:offset+nonce_length]
+        offset += nonce_length
+        symmetric_key = int(self.key.decrypt(encrypted_key))
+        if symmetric_key < 0 or symmetric_key >> (8*symmetric_key_length):
+            raise ValueError('Corrupt hybrid encrypted stream')
+        self.cipher = keccak.KeccakCipher(int2bytes(symmetric_key, symmetric_key_length), nonce,
+                                          encrypt_not_decrypt=False)
+        self.buffer = self.buffer[offset:]
+        return True
+
+    def decrypt(self, data):
+        """Decrypt a chunk of input, returning the next chunk of (not yet
+        authenticated) plaintext
+        """
+        if self.cipher is None:
+            self.buffer += data
+            if not self._parse_header():
+                return ''
+            data, self.buffer = self.buffer, ''
+        return self.cipher.decrypt(data)
+
+    def finish(self):
+        """Return the last chunk of plaintext, raising ValueError if the payload
+        was not authentic
+        """
+        if self.cipher is None:
+            raise ValueError('Truncated hybrid encrypted stream')
+        return self.cipher.verify_mac()
+
+def encrypt_stream(key, chunks, random=None):
+    """Given the recipient's key and an iterable of strings, yield the chunks
+    of the encrypted stream
+    """
+    encryptor = HybridEncryptor(key, random)
+    for chunk in chunks:
+        output = encryptor.encrypt(chunk)
+        if output:
+            yield output
+    yield encryptor.finish()
+
+def decrypt_stream(key, chunks):
+    """Given the recipient's key and an iterable of strings of an encrypted
+    stream, yield the chunks of plaintext. The generator raises ValueError
+    at the end if the stream was not authentic.
+    """
+    decryptor = HybridDecryptor(key)
+    for chunk in chunks:
+        output = decryptor.decrypt(chunk)
+        if output:
+            yield output
+    output = decryptor.finish()
+    if output:
+        yield output
+
+def _read_chunks(f, chunk_size):
+    return iter(lambda: f.read(chunk_size), '')
+
+def encrypt_file(key, infile, outfile, random=None, chunk_size=2**16):
+    """Encrypt the contents of the file object infile to the file object outfile"""
+    for chunk in encrypt_stream(key, _read_chunks(infile, chunk_size), random):
+        outfile.write(chunk)
+
+def decrypt_file(key, infile, outfile, chunk_size=2**16):
+    """Decrypt the contents of the file object infile to the file object
+    outfile, raising ValueError at the end if it was not authentic
+    """
+    for chunk in decrypt_stream(key, _read_chunks(infile, chunk_size)):
+        outfile.write(chunk)
+
+__all__ = ['HybridEncryptor', 'HybridDecryptor', 'encrypt_stream', 'decrypt_stream',
+           'encrypt_file', 'decrypt_file']
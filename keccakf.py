@@ -0,0 +1,342 @@
+import struct
+import keccak
+
+try:
+    import numpy
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+mask = 2**64 - 1
+
+# iota's constant for each of the 24 rounds
+round_constants = (0x0000000000000001, 0x0000000000008082, 0x800000000000808A,
+                   0x8000000080008000, 0x000000000000808B, 0x0000000080000001,
+                   0x8000000080008081, 0x8000000000008009, 0x000000000000008A,
+                   0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+                   0x000000008000808B, 0x800000000000008B, 0x8000000000008089,
+                   0x8000000000008003, 0x8000000000008002, 0x8000000000000080,
+                   0x000000000000800A, 0x800000008000000A, 0x8000000080008081,
+                   0x8000000000008080, 0x0000000080000001, 0x8000000080008008)
+
+# rho's rotation for the lane at x + 5*y
+rotations = ( 0,  1, 62, 28, 27,
+             36, 44,  6, 55, 20,
+              3, 10, 43, 25, 39,
+             41, 45, 15, 21,  8,
+             18,  2, 61, 56, 14)
+
+def keccak_f1600(lanes):
+    """Apply the Keccak-f[1600] permutation to lanes, a sequence of the 25
+    64 bit lanes of the state (the lane at x, y is lanes[x + 5*y]), and
+    return the permuted lanes as a new list
+
+    Every lane is a local variable and each step of the round is written out
+    in full, so a round is about 200 operations on small integers and no
+    list indexing.
+    """
+    (a00, a10, a20, a30, a40,
+     a01, a11, a21, a31, a41,
+     a02, a12, a22, a32, a42,
+     a03, a13, a23, a33, a43,
+     a04, a14, a24, a34, a44) = lanes
+    for rc in round_constants:
+        # theta
+        c0 = a00 ^ a01 ^ a02 ^ a03 ^ a04
+        c1 = a10 ^ a11 ^ a12 ^ a13 ^ a14
+        c2 = a20 ^ a21 ^ a22 ^ a23 ^ a24
+        c3 = a30 ^ a31 ^ a32 ^ a33 ^ a34
+        c4 = a40 ^ a41 ^ a42 ^ a43 ^ a44
+        d0 = c4 ^ (c1 << 1 | c1 >> 63) & mask
+        d1 = c0 ^ (c2 << 1 | c2 >> 63) & mask
+        d2 = c1 ^ (c3 << 1 | c3 >> 63) & mask
+        d3 = c2 ^ (c4 << 1 | c4 >> 63) & mask
+        d4 = c3 ^ (c0 << 1 | c0 >> 63) & mask
+        # rho and pi
+        t = a00 ^ d0
+        b00 = t
+        t = a10 ^ d1
+        b02 = (t << 1 | t >> 63) & mask
+        t = a20 ^ d2
+        b04 = (t << 62 | t >> 2) & mask
+        t = a30 ^ d3
+        b01 = (t << 28 | t >> 36) & mask
+        t = a40 ^ d4
+        b03 = (t << 27 | t >> 37) & mask
+        t = a01 ^ d0
+        b13 = (t << 36 | t >> 28) & mask
+        t = a11 ^ d1
+        b10 = (t << 44 | t >> 20) & mask
+        t = a21 ^ d2
+        b12 = (t << 6 | t >> 58) & mask
+        t = a31 ^ d3
+        b14 = (t << 55 | t >> 9) & mask
+        t = a41 ^ d4
+        b11 = (t << 20 | t >> 44) & mask
+        t = a02 ^ d0
+        b21 = (t << 3 | t >> 61) & mask
+        t = a12 ^ d1
+        b23 = (t << 10 | t >> 54) & mask
+        t = a22 ^ d2
+        b20 = (t << 43 | t >> 21) & mask
+        t = a32 ^ d3
+        b22 = (t << 25 | t >> 39) & mask
+        t = a42 ^ d4
+        b24 = (t << 39 | t >> 25) & mask
+        t = a03 ^ d0
+        b34 = (t << 41 | t >> 23) & mask
+        t = a13 ^ d1
+        b31 = (t << 45 | t >> 19) & mask
+        t = a23 ^ d2
+        b33 = (t << 15 | t >> 49) & mask
+        t = a33 ^ d3
+        b30 = (t << 21 | t >> 43) & mask
+        t = a43 ^ d4
+        b32 = (t << 8 | t >> 56) & mask
+        t = a04 ^ d0
+        b42 = (t << 18 | t >> 46) & mask
+        t = a14 ^ d1
+        b44 = (t << 2 | t >> 62) & mask
+        t = a24 ^ d2
+        b41 = (t << 61 | t >> 3) & mask
+        t = a34 ^ d3
+        b43 = (t << 56 | t >> 8) & mask
+        t = a44 ^ d4
+        b40 = (t << 14 | t >> 50) & mask
+        # chi and iota
+        a00 = b00 ^ (~b10 & b20) ^ rc
+        a10 = b10 ^ (~b20 & b30)
+        a20 = b20 ^ (~b30 & b40)
+        a30 = b30 ^ (~b40 & b00)
+        a40 = b40 ^ (~b00 & b10)
+        a01 = b01 ^ (~b11 & b21)
+        a11 = b11 ^ (~b21 & b31)
+        a21 = b21 ^ (~b31 & b41)
+        a31 = b31 ^ (~b41 & b01)
+        a41 = b41 ^ (~b01 & b11)
+        a02 = b02 ^ (~b12 & b22)
+        a12 = b12 ^ (~b22 & b32)
+        a22 = b22 ^ (~b32 & b42)
+        a32 = b32 ^ (~b42 & b02)
+        a42 = b42 ^ (~b02 & b12)
+        a03 = b03 ^ (~b13 & b23)
+        a13 = b13 ^ (~b23 & b33)
+        a23 = b23 ^ (~b33 & b43)
+        a33 = b33 ^ (~b43 & b03)
+        a43 = b43 ^ (~b03 & b13)
+        a04 = b04 ^ (~b14 & b24)
+        a14 = b14 ^ (~b24 & b34)
+        a24 = b24 ^ (~b34 & b44)
+        a34 = b34 ^ (~b44 & b04)
+        a44 = b44 ^ (~b04 & b14)
+    return [a00, a10, a20, a30, a40,
+            a01, a11, a21, a31, a41,
+            a02, a12, a22, a32, a42,
+            a03, a13, a23, a33, a43,
+            a04, a14, a24, a34, a44]
+
+class LaneKeccak(object):
+    """Class implementing the Keccak sponge (with the padding of the original
+    Keccak submission, like keccak.Keccak) on the lane array permutation
+    keccak_f1600. It only supports the 1600 bit permutation, so r + c must be
+    1600 and r a multiple of 8.
+
+    absorb takes a str or any other object implementing the buffer protocol
+    whose length is in bytes (bytearray, mmap.mmap, buffer, or a memoryview
+    of bytes). Whole blocks are unpacked straight out of it with
+    struct.unpack_from, and only the partial block left over at the end is
+    copied, so the input is never joined or sliced into new strings.
+    """
+    def __init__(self, r=1024, c=576, fixed_out=False):
+        """r: (optional) the rate in bits, default 1024
+        c: (optional) the capacity in bits, default 576
+        fixed_out: (optional) accepted for compatibility with keccak.Keccak,
+            the output doesn't depend on it
+        """
+        if r + c != 1600:
+            raise ValueError('LaneKeccak only implements Keccak-f[1600], r + c must be 1600')
+        if r <= 0 or r % 8:
+            raise ValueError('r must be a positive multiple of 8')
+        self.r = r
+        self.c = c
+        self.fixed_out = fixed_out
+        self.rate = r // 8
+        self.rate_lanes = -(-self.rate // 8)
+        self.lanes = [0] * 25
+        # the bytes of the block being absorbed, always less than a whole block
+        self.partial = bytearray()
+        self.output = None
+        self.output_offset = 0
+
+    def _absorb_blocks(self, data, start, end):
+        """XOR the whole blocks of data from start up to end into the state,
+        permuting after each one
+        """
+        lanes = self.lanes
+        rate = self.rate
+        rate_lanes = self.rate_lanes
+        # a rate that isn't a whole number of lanes ends in a partial lane,
+        # which is unpacked byte by byte
+        whole_lanes = rate // 8
+        fmt = '<%dQ' % whole_lanes
+        tail_fmt = '<%dB' % (rate - 8*whole_lanes)
+        for offset in xrange(start, end, rate):
+            words = struct.unpack_from(fmt, data, offset)
+            if whole_lanes < rate_lanes:
+                last = 0
+                for i, byte in enumerate(struct.unpack_from(tail_fmt, data, offset + 8*whole_lanes)):
+                    last |= byte << 8*i
+                words += (last,)
+            lanes = keccak_f1600([ lane ^ word for lane, word in zip(lanes, words) ] + lanes[rate_lanes:])
+        self.lanes = lanes
+
+    def absorb(self, data):
+        if self.output is not None:
+            raise RuntimeError('Cannot absorb after squeezing')
+        rate = self.rate
+        length = len(data)
+        start = 0
+        if self.partial:
+            # complete the partial block first
+            start = min(rate - len(self.partial), length)
+            self.partial += data[:start]
+            if len(self.partial) < rate:
+                return
+            self._absorb_blocks(self.partial, 0, rate)
+            self.partial = bytearray()
+        end = start + (length - start) // rate * rate
+        self._absorb_blocks(data, start, end)
+        self.partial += data[end:]
+
+    def _output_block(self):
+        return struct.pack('<%dQ' % self.rate_lanes, *self.lanes[:self.rate_lanes])[:self.rate]
+
+    def squeeze(self, n):
+        """Return the next n bytes of output. No more input may be absorbed."""
+        if self.output is None:
+            self._absorb_blocks(_pad(bytes(self.partial), self.rate), 0, self.rate)
+            self.partial = bytearray()
+            self.output = self._output_block()
+        parts = list()
+        while n > 0:
+            if self.output_offset == self.rate:
+                self.lanes = keccak_f1600(self.lanes)
+                self.output = self._output_block()
+                self.output_offset = 0
+            part = self.output[self.output_offset:self.output_offset+n]
+            self.output_offset += len(part)
+            n -= len(part)
+            parts.append(part)
+        return ''.join(parts)
+
+def _pad(data, rate):
+    """Pad data to a multiple of rate bytes as in the Keccak submission: a 1
+    bit, zeros and a final 1 bit
+    """
+    zeros = -(len(data) + 2) % rate
+    if zeros == rate - 1:
+        return data + '\x81'
+    return data + '\x01' + '\x00' * zeros + '\x80'
+
+if has_numpy:
+    _np_round_constants = [ numpy.uint64(rc) for rc in round_constants ]
+    _np_rotations = [ (numpy.uint64(n), numpy.uint64(64 - n)) for n in rotations ]
+
+    def keccak_f1600_many(states):
+        """Apply the Keccak-f[1600] permutation to many states at once. states
+        is a (25, k) numpy array of uint64 holding k independent states, one
+        per column, with the lane at x, y in row x + 5*y. Returns the permuted
+        states as a new array of the same shape.
+        """
+        a = list(states)
+        b = [None] * 25
+        one, sixty_three = numpy.uint64(1), numpy.uint64(63)
+        for rc in _np_round_constants:
+            c = [ a[x] ^ a[x+5] ^ a[x+10] ^ a[x+15] ^ a[x+20] for x in xrange(5) ]
+            d = [ c[(x-1) % 5] ^ (c[(x+1) % 5] << one | c[(x+1) % 5] >> sixty_three)
+                  for x in xrange(5) ]
+            for y in xrange(5):
+                for x in xrange(5):
+                    lane = a[x + 5*y] ^ d[x]
+                    left, right = _np_rotations[x + 5*y]
+                    if left:
+                        lane = lane << left | lane >> right
+                    b[y + 5*((2*x + 3*y) % 5)] = lane
+            a = [ b[i] ^ (~b[(i+1) % 5 + i//5*5] & b[(i+2) % 5 + i//5*5]) for i in xrange(25) ]
+            a[0] = a[0] ^ rc
+        return numpy.array(a)
+
+    def hash_many(messages, r=1088, c=512, n=32):
+        """Return the n byte Keccak hashes (with rate r and capacity c in bits,
+        r + c = 1600) of each of messages, permuting all of the messages with
+        the same number of blocks together with keccak_f1600_many
+        """
+        if r + c != 1600:
+            raise ValueError('hash_many only implements Keccak-f[1600], r + c must be 1600')
+        if r <= 0 or r % 8:
+            raise ValueError('r must be a positive multiple of 8')
+        rate = r // 8
+        rate_lanes = -(-rate // 8)
+        groups = dict()
+        for i, message in enumerate(messages):
+            padded = _pad(message, rate)
+            groups.setdefault(len(padded) // rate, list()).append((i, padded))
+        digests = dict()
+        for blocks, group in groups.iteritems():
+            data = numpy.frombuffer(''.join( padded for i, padded in group ), dtype=numpy.uint8)
+            data = data.reshape(len(group), blocks, rate)
+            words = numpy.zeros((len(group), blocks, 8*rate_lanes), dtype=numpy.uint8)
+            words[:, :, :rate] = data
+            words = words.view('<u8')
+            states = numpy.zeros((25, len(group)), dtype=numpy.uint64)
+            for block in xrange(blocks):
+                states[:rate_lanes] ^= words[:, block, :].T
+                states = keccak_f1600_many(states)
+            outputs = list()
+            while True:
+                output = numpy.ascontiguousarray(states[:rate_lanes].T, dtype='<u8').view(numpy.uint8)[:, :rate]
+                outputs.append(output)
+                if len(outputs) * rate >= n:
+                    break
+                states = keccak_f1600_many(states)
+            output = numpy.concatenate(outputs, axis=1)[:, :n]
+            for (i, padded), digest in zip(group, output):
+                digests[i] = digest.tostring()
+        return [ digests[i] for i in xrange(len(digests)) ]
+
+keccak_engines = { 'reference':keccak.Keccak, 'lanes':LaneKeccak }
+
+# the name of the engine used when none is specified
+default_engine = 'reference'
+
+def get_engine(name=None):
+    """Return the sponge class with the given name (a key of keccak_engines),
+    or the default engine if name is None
+    """
+    if name is None:
+        name = default_engine
+    try:
+        return keccak_engines[name]
+    except KeyError:
+        raise ValueError('Unknown Keccak engine %s' % repr(name))
+
+def set_default_engine(name):
+    """Select the engine used when none is specified"""
+    global default_engine
+    get_engine(name)
+    default_engine = name
+
+def new(r=1024, c=576, fixed_out=False, engine=None):
+    """Return a new sponge with rate r and capacity c from the named engine.
+    The lanes engine only implements Keccak-f[1600], so other widths always
+    use keccak.Keccak.
+    """
+    cls = get_engine(engine)
+    if cls is LaneKeccak and (r + c != 1600 or r % 8):
+        cls = keccak.Keccak
+    return cls(r=r, c=c, fixed_out=fixed_out)
+
+__all__ = ['has_numpy', 'keccak_f1600', 'LaneKeccak', 'keccak_engines', 'get_engine',
+           'set_default_engine', 'new']
+if has_numpy:
+    __all__ += ['keccak_f1600_many', 'hash_many']
@@ -0,0 +1,171 @@
+import keccak
+import keccakf
+from keccaktree import KeccakTree
+import mmap
+import os
+import random as _random
+from intbytes import int2bytes
+from binascii import hexlify
+
+default_chunk_size = 2**20
+nonce_length = 16
+
+def _chunks(f, chunk_size, views=False):
+    """Yield the contents of the file object (or filename) f in chunks of
+    chunk_size bytes, memory mapping regular files rather than reading them
+
+    With views, the chunks are views rather than strings: buffer objects over
+    the memory map, or a memoryview of one bytearray that is read into again
+    for each chunk. Each chunk is only valid until the next one is yielded,
+    so they are only for consumers that copy whatever they keep, like
+    keccakf.LaneKeccak and KeccakTree.
+    """
+    if isinstance(f, basestring):
+        with open(f, 'rb') as f:
+            for chunk in _chunks(f, chunk_size, views):
+                yield chunk
+        return
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, EnvironmentError, ValueError):
+        # not a regular file (or empty), read it instead
+        if views and hasattr(f, 'readinto'):
+            chunk = bytearray(chunk_size)
+            view = memoryview(chunk)
+            for length in iter(lambda: f.readinto(chunk), 0):
+                yield view[:length]
+            return
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            yield chunk
+        return
+    try:
+        for offset in xrange(0, len(data), chunk_size):
+            if views:
+                yield buffer(data, offset, chunk_size)
+            else:
+                yield data[offset:offset+chunk_size]
+    finally:
+        data.close()
+
+def _aligned(chunk_size, r):
+    """Round chunk_size to a positive multiple of the rate (r bits) in bytes"""
+    rate = max(r // 8, 1)
+    return max(chunk_size // rate, 1) * rate
+
+def hash_file(f, r=1088, c=512, n=32, chunk_size=default_chunk_size, engine=None):
+    """Return the n byte Keccak hash (with rate r and capacity c in bits) of the
+    contents of the file object or filename f, reading it in chunks that are
+    a multiple of the rate so memory use is constant. engine names the
+    keccakf engine to hash with (default keccakf.default_engine).
+    """
+    k = keccakf.new(r=r, c=c, fixed_out=True, engine=engine)
+    for chunk in _chunks(f, _aligned(chunk_size, r), isinstance(k, keccakf.LaneKeccak)):
+        k.absorb(chunk)
+    return k.squeeze(n)
+
+def tree_hash_file(f, r=1088, c=512, n=32, leaf_size=None, fanout=16, processes=0,
+                   chunk_size=default_chunk_size, engine=None):
+    """Return the n byte keccaktree.KeccakTree hash of the contents of the file
+    object or filename f, hashing its leaves in a pool of processes worker
+    processes (default 0, one per CPU; None to hash serially)
+    """
+    tree = KeccakTree(r, c, leaf_size, fanout, processes, engine)
+    try:
+        for chunk in _chunks(f, _aligned(chunk_size, r), True):
+            tree.absorb(chunk)
+        return tree.squeeze(n)
+    finally:
+        tree.close()
+
+def encrypt_file(key, infile, outfile, random=None, chunk_size=default_chunk_size):
+    """Encrypt and authenticate the contents of infile (a file object or
+    filename) with keccak.KeccakCipher under key, writing a fresh nonce, the
+    ciphertext and the MAC to the file object outfile
+    """
+    if random is None:
+        random = _random.SystemRandom()
+    nonce = int2bytes(random.getrandbits(8*nonce_length), nonce_length)
+    cipher = keccak.KeccakCipher(key, nonce, encrypt_not_decrypt=True)
+    outfile.write(nonce)
+    for chunk in _chunks(infile, chunk_size):
+        outfile.write(cipher.encrypt(chunk))
+    outfile.write(cipher.emit_mac())
+
+def decrypt_file(key, infile, outfile, chunk_size=default_chunk_size):
+    """Decrypt a file written by encrypt_file to the file object outfile,
+    raising ValueError at the end if it was not authentic. The plaintext
+    written to outfile must not be trusted until then.
+    """
+    chunks = _chunks(infile, chunk_size)
+    nonce = ''
+    cipher = None
+    for chunk in chunks:
+        if cipher is None:
+            nonce += chunk
+            if len(nonce) < nonce_length:
+                continue
+            nonce, chunk = nonce[:nonce_length], nonce[nonce_length:]
+            cipher = keccak.KeccakCipher(key, nonce, encrypt_not_decrypt=False)
+        outfile.write(cipher.decrypt(chunk))
+    if cipher is None:
+        raise ValueError('Truncated encrypted file')
+    outfile.write(cipher.verify_mac())
+
+def main(argv):
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description='Hash or encrypt files with Keccak')
+    subparsers = parser.add_subparsers(dest='command')
+    hash_parser = subparsers.add_parser('hash', help='print the Keccak hash of each file')
+    hash_parser.add_argument('-r', type=int, default=1088, help='rate in bits')
+    hash_parser.add_argument('-c', type=int, default=512, help='capacity in bits')
+    hash_parser.add_argument('-n', type=int, default=32, help='output length in bytes')
+    hash_parser.add_argument('--tree', action='store_true',
+                             help='use the parallel tree hash (not compatible with the plain hash)')
+    hash_parser.add_argument('--leaf-size', type=int,
+                             help='tree hash leaf size in bytes, a multiple of the rate, default 8192 times the rate')
+    hash_parser.add_argument('--fanout', type=int, default=16, help='tree hash fanout')
+    hash_parser.add_argument('--processes', type=int, default=0,
+                             help='tree hash worker processes, default one per CPU')
+    hash_parser.add_argument('--engine', choices=sorted(keccakf.keccak_engines),
+                             help='Keccak implementation, default %s' % keccakf.default_engine)
+    hash_parser.add_argument('files', nargs='+')
+    for command in ['encrypt', 'decrypt']:
+        cipher_parser = subparsers.add_parser(command, help='%s a file with KeccakCipher' % command)
+        cipher_parser.add_argument('keyfile', help='file holding the key')
+        cipher_parser.add_argument('infile')
+        cipher_parser.add_argument('outfile')
+    args = parser.parse_args(argv)
+
+    if args.command == 'hash':
+        for filename in args.files:
+            if args.tree:
+                digest = tree_hash_file(filename, args.r, args.c, args.n,
+                                        args.leaf_size, args.fanout, args.processes,
+                                        engine=args.engine)
+            else:
+                digest = hash_file(filename, args.r, args.c, args.n, engine=args.engine)
+            print '%s  %s' % (hexlify(digest), filename)
+        return 0
+
+    with open(args.keyfile, 'rb') as f:
+        key = f.read()
+    with open(args.outfile, 'wb') as outfile:
+        if args.command == 'encrypt':
+            encrypt_file(key, args.infile, outfile)
+            return 0
+        try:
+            decrypt_file(key, args.infile, outfile)
+        except ValueError as e:
+            sys.stderr.write('%s: %s\n' % (args.infile, e))
+        else:
+            return 0
+    # don't leave unauthenticated plaintext lying around
+    os.remove(args.outfile)
+    return 1
+
+__all__ = ['hash_file', 'tree_hash_file', 'encrypt_file', 'decrypt_file']
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main(sys.argv[1:]))
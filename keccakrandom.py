@@ -0,0 +1,133 @@
+import random as _random
+import keccak
+from intbytes import int2bytes
+
+# blocks of the rate squeezed into the buffer at a time
+default_blocks = 16
+
+class BufferedKeccakRandom(_random.Random):
+    """Class wrapping a keccak.KeccakRandom that squeezes its output in batches
+    of many blocks and serves getrandbits (and so randrange, randint, choice,
+    etc.) from a buffer of those bits
+
+    KeccakRandom's output doesn't depend on read size: getrandbits(a + b) is
+    getrandbits(a) | getrandbits(b) << a. So getrandbits returns exactly the
+    same stream as the KeccakRandom it wraps, with one call into the sponge
+    per batch instead of per value. random() is made from 53 bits of that
+    stream. getstate includes the buffer, so states round-trip exactly
+    through setstate and from_state.
+    """
+    def __init__(self, seed='', keccak_args={}, blocks=default_blocks):
+        """seed: (optional) the seed of the KeccakRandom, default ''
+        keccak_args: (optional) passed on to KeccakRandom
+        blocks: (optional) the number of blocks of the rate squeezed at a time,
+            default default_blocks
+        """
+        if blocks < 1:
+            raise ValueError('blocks must be at least 1')
+        self.keccak_args = keccak_args
+        self.blocks = blocks
+        _random.Random.__init__(self, seed)
+
+    def _reset(self, source):
+        self.source = source
+        self.batch_bits = self.blocks * source.k.r
+        self.buffer = 0
+        self.buffered = 0
+        self.gauss_next = None
+
+    def seed(self, a=''):
+        self._reset(keccak.KeccakRandom(a, keccak_args=self.keccak_args))
+
+    def _refill(self, k):
+        """Squeeze whole batches into the buffer until it holds at least k bits"""
+        batches = -(-(k - self.buffered) // self.batch_bits)
+        self.buffer |= self.source.getrandbits(batches * self.batch_bits) << self.buffered
+        self.buffered += batches * self.batch_bits
+
+    def getrandbits(self, k):
+        if k <= 0:
+            raise ValueError('number of bits must be greater than zero')
+        if self.buffered < k:
+            self._refill(k)
+        value = self.buffer & ((1 << k) - 1)
+        self.buffer >>= k
+        self.buffered -= k
+        return value
+
+    def getrandbits_many(self, k, count):
+        """Return a list of count values of k bits, the same as calling
+        getrandbits(k) count times
+        """
+        if k <= 0:
+            raise ValueError('number of bits must be greater than zero')
+        mask = (1 << k) - 1
+        values = list()
+        while len(values) < count:
+            if self.buffered < k:
+                self._refill(k)
+            # take as many values as the buffer holds without refilling it, so
+            # the shifts are on numbers of about one batch
+            take = min(count - len(values), self.buffered // k)
+            buffer = self.buffer
+            for _ in xrange(take):
+                values.append(buffer & mask)
+                buffer >>= k
+            self.buffer = buffer
+            self.buffered -= take * k
+        return values
+
+    def randbytes(self, n):
+        """Return n random bytes, the first from the lowest bits of the stream"""
+        if n == 0:
+            return ''
+        return int2bytes(self.getrandbits(8 * n), n)[::-1]
+
+    def random(self):
+        """Return a float in [0, 1) made from 53 bits of the stream"""
+        return self.getrandbits(53) * 2.0**-53
+
+    def jumpahead(self, n):
+        """Skip n blocks of the rate, the same as KeccakRandom.jumpahead from a
+        block boundary
+        """
+        skip = n * self.source.k.r
+        if skip <= self.buffered:
+            self.buffer >>= skip
+            self.buffered -= skip
+            return
+        skip -= self.buffered
+        self.buffer = 0
+        self.buffered = 0
+        # the source is only ever read in whole blocks, so it is on a block
+        # boundary: skip the whole blocks there and drop the rest from a batch
+        self.source.jumpahead(skip // self.source.k.r)
+        skip %= self.source.k.r
+        if skip:
+            self._refill(skip)
+            self.buffer >>= skip
+            self.buffered -= skip
+
+    def getstate(self):
+        return (self.source.getstate(), self.buffer, self.buffered, self.blocks, self.gauss_next)
+
+    def setstate(self, state):
+        source_state, buffer, buffered, blocks, gauss_next = state
+        self.source.setstate(source_state)
+        self.blocks = blocks
+        self.batch_bits = blocks * self.source.k.r
+        self.buffer = buffer
+        self.buffered = buffered
+        self.gauss_next = gauss_next
+
+    @classmethod
+    def from_state(cls, state):
+        """Return a new BufferedKeccakRandom in the given state (from getstate)"""
+        self = cls.__new__(cls)
+        self.keccak_args = {}
+        self.blocks = state[3]
+        self._reset(keccak.KeccakRandom.from_state(state[0]))
+        self.setstate(state)
+        return self
+
+__all__ = ['BufferedKeccakRandom', 'default_blocks']
@@ -0,0 +1,154 @@
+import keccakf
+import multiprocessing
+from collections import deque
+from intbytes import int2bytes
+
+# the first byte absorbed by each kind of node, so that they can't be confused
+leaf_marker = '\x00'
+interior_marker = '\x01'
+root_marker = '\x02'
+
+def _node_hash(r, c, marker, parts, n, engine=None):
+    """Return the n byte hash of a tree node made up of parts"""
+    k = keccakf.new(r=r, c=c, fixed_out=True, engine=engine)
+    k.absorb(marker)
+    for part in parts:
+        k.absorb(part)
+    return k.squeeze(n)
+
+def _hash_leaf(args):
+    r, c, engine, leaf = args
+    return _node_hash(r, c, leaf_marker, [leaf], c // 16, engine)
+
+def _copy(data):
+    """Return the contents of data, a slice of an object implementing the
+    buffer protocol, as a str
+    """
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return bytes(data)
+
+class KeccakTree(object):
+    """Class representing a tree hash built on the Keccak sponge, in the style
+    of Sakura: the input is cut into leaves of leaf_size bytes, each of which
+    is hashed independently (optionally in a pool of worker processes) to a
+    chaining value of c/2 bits. Chaining values are hashed in groups of fanout
+    into interior nodes until at most fanout remain, and those are hashed,
+    together with the tree parameters and the input length, by the root
+    node, from which the output is squeezed.
+
+    Every node starts with a marker byte for its kind, so leaves, interior
+    nodes and the root can't be confused for each other. The digest depends
+    on leaf_size and fanout, but not on how the input was split into calls
+    to absorb or on the number of processes.
+
+    absorb takes a str or any other object implementing the buffer protocol
+    whose length is in bytes, like keccakf.LaneKeccak. Each leaf is copied
+    out of it once, into the string that is hashed (or sent to a worker).
+    """
+    def __init__(self, r=1088, c=512, leaf_size=None, fanout=16, processes=None, engine=None):
+        """r: (optional) the rate in bits, default 1088
+        c: (optional) the capacity in bits, default 512
+        leaf_size: (optional) the number of input bytes per leaf, a multiple of
+            the rate in bytes, default 8192 times the rate (about 1MiB for the
+            default rate)
+        fanout: (optional) the number of children of each interior node and of
+            the root, at least 2, default 16
+        processes: (optional) if given, hash leaves in a pool of this many
+            worker processes (0 for one per CPU)
+        engine: (optional) the name of the keccakf engine to hash with, default
+            keccakf.default_engine. The digest doesn't depend on it.
+        """
+        rate = max(r // 8, 1)
+        if leaf_size is None:
+            leaf_size = 8192 * rate
+        if leaf_size < 1 or leaf_size % rate:
+            raise ValueError('leaf_size must be a positive multiple of the rate in bytes (%d)' % rate)
+        if fanout < 2:
+            raise ValueError('fanout must be at least 2')
+        self.r = r
+        self.c = c
+        self.leaf_size = leaf_size
+        self.fanout = fanout
+        # resolve the default now, so the worker processes use the same engine
+        self.engine = engine if engine is not None else keccakf.default_engine
+        keccakf.get_engine(self.engine)
+        # the bytes of the leaf being absorbed, always less than a whole leaf
+        self.partial = bytearray()
+        self.length = 0
+        self.chaining_values = list()
+        self.pending = deque()
+        self.root = None
+        self.pool = None
+        if processes is not None:
+            self.pool = multiprocessing.Pool(processes or None)
+            # bound the number of leaves held in memory waiting to be hashed
+            self.max_pending = 2 * (processes or multiprocessing.cpu_count())
+
+    def _submit(self, leaf):
+        if self.pool is None:
+            self.chaining_values.append(_hash_leaf((self.r, self.c, self.engine, leaf)))
+            return
+        while len(self.pending) >= self.max_pending:
+            self.chaining_values.append(self.pending.popleft().get())
+        self.pending.append(self.pool.apply_async(_hash_leaf, ((self.r, self.c, self.engine, leaf),)))
+
+    def absorb(self, data):
+        if self.root is not None:
+            raise RuntimeError('Cannot absorb after squeezing')
+        leaf_size = self.leaf_size
+        length = len(data)
+        self.length += length
+        start = 0
+        if self.partial:
+            # complete the partial leaf first
+            start = min(leaf_size - len(self.partial), length)
+            self.partial += data[:start]
+            if len(self.partial) < leaf_size:
+                return
+            self._submit(bytes(self.partial))
+            self.partial = bytearray()
+        end = start + (length - start) // leaf_size * leaf_size
+        for offset in xrange(start, end, leaf_size):
+            self._submit(_copy(data[offset:offset+leaf_size]))
+        self.partial += data[end:]
+
+    def _finish(self):
+        """Hash the last leaf and the interior nodes and start the root"""
+        if self.partial or not (self.chaining_values or self.pending):
+            self._submit(bytes(self.partial))
+        self.partial = bytearray()
+        try:
+            while self.pending:
+                self.chaining_values.append(self.pending.popleft().get())
+        finally:
+            self.close()
+        level = self.chaining_values
+        while len(level) > self.fanout:
+            level = [ _node_hash(self.r, self.c, interior_marker,
+                                 level[i:i+self.fanout] + [int2bytes(len(level[i:i+self.fanout]), 8)],
+                                 self.c // 16, self.engine)
+                      for i in xrange(0, len(level), self.fanout) ]
+        self.root = keccakf.new(r=self.r, c=self.c, fixed_out=True, engine=self.engine)
+        self.root.absorb(root_marker)
+        self.root.absorb(''.join([int2bytes(self.leaf_size, 8),
+                                  int2bytes(self.fanout, 8),
+                                  int2bytes(self.length, 8),
+                                  int2bytes(len(level), 8)]))
+        for chaining_value in level:
+            self.root.absorb(chaining_value)
+
+    def squeeze(self, n):
+        """Return the next n bytes of output. No more input may be absorbed."""
+        if self.root is None:
+            self._finish()
+        return self.root.squeeze(n)
+
+    def close(self):
+        """Stop the worker processes, if any"""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+__all__ = ['KeccakTree']
@@ -0,0 +1,244 @@
+from itertools import izip
+from threading import RLock
+from bigint import get_backend
+
+def invert(a, modulus, backend=None):
+    """Compute the multiplicative inverse of a modulo modulus
+    Raises ValueError if a is not invertible
+    """
+    return int(get_backend(backend).invert(a, modulus))
+
+def choose_window(bits):
+    """Pick the window width that minimizes the number of multiplications
+    needed to raise one base to an exponent of the given bit length
+    (table construction plus one multiplication per window)
+    """
+    return min(xrange(1, 9), key=lambda w: (1 << w) - 2 + -(-bits // w))
+
+def multi_pow(bases, exponents, modulus, window=None, backend=None):
+    """Compute the product of base**exponent for all pairs of bases and
+    exponents, modulo modulus
+
+    This uses Straus's simultaneous (interleaved) windowed exponentiation: the
+    squarings are shared between all the bases, so the cost of N exponentiations
+    of b bits is b squarings plus about N*b/window multiplications, instead of
+    N*b squarings and N*b/2 multiplications.
+
+    bases: an iterable of integers
+    exponents: an iterable of integers, the same length as bases. Negative
+        exponents require the corresponding base to be invertible.
+    modulus: the modulus to perform the computation in
+    window: (optional) the window width in bits, by default it is chosen based
+        on the length of the longest exponent
+    backend: (optional) the name of the big integer backend to compute with
+        (see bigint.get_backend), default None, the default backend
+    """
+    backend = get_backend(backend)
+    modulus = backend.mpz(modulus)
+    pairs = list()
+    for base, exponent in izip(bases, exponents):
+        base = backend.mpz(base)
+        if exponent < 0:
+            base, exponent = backend.invert(base, modulus), -exponent
+        if exponent:
+            pairs.append((base % modulus, exponent))
+    if not pairs:
+        return int(1 % modulus)
+
+    bits = max(exponent.bit_length() for _, exponent in pairs)
+    if window is None:
+        window = choose_window(bits)
+    mask = (1 << window) - 1
+
+    tables = list()
+    for base, exponent in pairs:
+        table = [1, base]
+        for _ in xrange(mask - 1):
+            table.append(table[-1] * base % modulus)
+        tables.append((table, exponent))
+
+    retval = 1
+    for shift in xrange(window * (-(-bits // window) - 1), -1, -window):
+        if retval != 1:
+            for _ in xrange(window):
+                retval = retval * retval % modulus
+        for table, exponent in tables:
+            digit = (exponent >> shift) & mask
+            if digit:
+                retval = retval * table[digit] % modulus
+    return int(retval)
+
+def _table_nbytes(rows, window, modulus):
+    """The approximate number of bytes occupied by rows rows of powers"""
+    return rows * (1 << window) * ((modulus.bit_length() + 7) // 8)
+
+class FixedBaseTable(object):
+    """Class representing a precomputed table of powers of a fixed base, for
+    raising that base to many different exponents
+
+    The table holds base**(j << (k*window)) for every window k and digit j, so
+    an exponentiation is one multiplication per window of the exponent and no
+    squarings at all. Windows are added lazily as longer exponents are seen.
+    """
+    def __init__(self, base, modulus, window=4, backend=None):
+        """base: the integer that will be raised to different powers
+        modulus: the modulus to perform the computation in
+        window: (optional) the window width in bits, default 4
+        backend: (optional) the name of the big integer backend to compute
+            with, default None, the default backend
+        """
+        self.backend = get_backend(backend)
+        self.modulus = self.backend.mpz(modulus)
+        self.base = self.backend.mpz(base) % self.modulus
+        self.window = window
+        self.rows = list()
+
+    def extend(self, bits):
+        """Ensure that the table can handle exponents of the given bit length"""
+        while len(self.rows) * self.window < bits:
+            if self.rows:
+                previous = self.rows[-1]
+                window_base = previous[-1] * previous[1] % self.modulus
+            else:
+                window_base = self.base
+            row = [1, window_base]
+            for _ in xrange((1 << self.window) - 2):
+                row.append(row[-1] * window_base % self.modulus)
+            self.rows.append(row)
+
+    def _multiply_into(self, accumulator, exponent):
+        """Multiply accumulator by base**exponent for a non-negative exponent"""
+        self.extend(exponent.bit_length())
+        mask = (1 << self.window) - 1
+        for row in self.rows:
+            if not exponent:
+                break
+            digit = exponent & mask
+            if digit:
+                accumulator = accumulator * row[digit] % self.modulus
+            exponent >>= self.window
+        return accumulator
+
+    def pow(self, exponent):
+        """Compute base**exponent modulo modulus"""
+        if exponent < 0:
+            return int(self.backend.invert(self._multiply_into(1, -exponent), self.modulus))
+        return int(self._multiply_into(1 % self.modulus, exponent))
+
+    @property
+    def nbytes(self):
+        """The approximate number of bytes occupied by the precomputed powers"""
+        return self.nbytes_for(0)
+
+    def nbytes_for(self, bits):
+        """The approximate number of bytes that the precomputed powers would
+        occupy once the table was extended to exponents of the given bit length
+        """
+        return _table_nbytes(max(len(self.rows), -(-bits // self.window)), self.window, self.modulus)
+
+def fixed_multi_pow(tables, exponents):
+    """Compute the product of table.base**exponent for all pairs of tables (all
+    FixedBaseTable instances with the same modulus) and exponents
+    """
+    tables = list(tables)
+    if not tables:
+        raise ValueError('At least one table is required')
+    modulus = tables[0].modulus
+    positive = 1 % modulus
+    negative = 1
+    for table, exponent in izip(tables, exponents):
+        if exponent < 0:
+            negative = table._multiply_into(negative, -exponent)
+        else:
+            positive = table._multiply_into(positive, exponent)
+    if negative != 1:
+        positive = positive * tables[0].backend.invert(negative, modulus) % modulus
+    return int(positive)
+
+class FixedBaseCache(object):
+    """Class representing a memory-bounded collection of FixedBaseTable
+    instances. It is safe to share between threads.
+
+    Tables are admitted until the budget is reached, after which no more are
+    built until some are discarded. Routing uses the same tables in the same
+    order every round, so evicting the least recently used table would evict
+    every table just before it was needed again once they didn't all fit.
+    Keeping a stable subset instead means that the bases that do have tables
+    are always fast, and the rest cost no more than with multi_pow.
+    """
+    def __init__(self, budget=64*2**20, window=4, backend=None):
+        """budget: (optional) the approximate number of bytes that the tables
+            may occupy, default 64MiB
+        window: (optional) the window width of newly built tables, default 4
+        backend: (optional) the name of the big integer backend of newly built
+            tables, default None, the default backend at the time the cache is
+            created
+        """
+        self.budget = budget
+        self.window = window
+        self.backend = get_backend(backend).name
+        self.lock = RLock()
+        with self.lock:
+            self.tables = dict()
+            self.nbytes = 0
+
+    def get(self, key, base, modulus, bits=0):
+        """Return the table for the given key, building it if it doesn't exist
+        or if it was built for a different base or modulus, and ensuring that
+        it can handle exponents of the given bit length. Returns None if that
+        would take the cache over its budget.
+        """
+        with self.lock:
+            table = self.tables.get(key)
+            if table is not None and (table.base != base % modulus or table.modulus != modulus):
+                del self.tables[key]
+                self.nbytes -= table.nbytes
+                table = None
+            if table is None:
+                if self.nbytes + _table_nbytes(-(-bits // self.window), self.window, modulus) > self.budget:
+                    return None
+                table = FixedBaseTable(base, modulus, self.window, self.backend)
+                self.tables[key] = table
+            else:
+                if self.nbytes - table.nbytes + table.nbytes_for(bits) > self.budget:
+                    return None
+                self.nbytes -= table.nbytes
+            table.extend(bits)
+            self.nbytes += table.nbytes
+            return table
+
+    def multi_pow(self, keys, bases, exponents, modulus):
+        """Compute the product of base**exponent for all bases and exponents,
+        modulo modulus, like multi_pow, using the table for each key (see get)
+        where there is room for one and multi_pow for the other bases
+        """
+        exponents = list(exponents)
+        bits = max([ abs(exponent).bit_length() for exponent in exponents ] + [0])
+        tables, table_exponents = list(), list()
+        rest, rest_exponents = list(), list()
+        for key, base, exponent in izip(keys, bases, exponents):
+            table = self.get(key, base, modulus, bits)
+            if table is None:
+                rest.append(base)
+                rest_exponents.append(exponent)
+            else:
+                tables.append(table)
+                table_exponents.append(exponent)
+        retval = multi_pow(rest, rest_exponents, modulus, backend=self.backend)
+        if tables:
+            retval = retval * fixed_multi_pow(tables, table_exponents) % modulus
+        return retval
+
+    def discard(self, predicate):
+        """Drop every table whose key satisfies predicate"""
+        with self.lock:
+            for key in [ key for key in self.tables.iterkeys() if predicate(key) ]:
+                self.nbytes -= self.tables.pop(key).nbytes
+
+    def clear(self):
+        with self.lock:
+            self.tables.clear()
+            self.nbytes = 0
+
+__all__ = ['invert', 'choose_window', 'multi_pow',
+           'FixedBaseTable', 'fixed_multi_pow', 'FixedBaseCache']
@@ -0,0 +1,164 @@
+from bigint import get_backend
+import multiprocessing
+
+def _small_primes(limit):
+    """Return the list of odd primes less than limit (sieve of Eratosthenes)"""
+    composite = bytearray(limit)
+    retval = list()
+    for i in xrange(3, limit, 2):
+        if not composite[i]:
+            retval.append(i)
+            for j in xrange(i*i, limit, 2*i):
+                composite[j] = 1
+    return retval
+
+# odd primes used to sieve candidates before they are tested with Miller-Rabin
+small_primes = _small_primes(2**14)
+
+def miller_rabin_rounds(bits):
+    """The number of Miller-Rabin rounds needed for a random candidate of the
+    given bit length to be composite with probability less than 2**-100
+    (FIPS 186-4 table C.3)
+    """
+    if bits >= 1536:
+        return 3
+    if bits >= 1024:
+        return 4
+    if bits >= 512:
+        return 7
+    return 40
+
+def is_probable_prime(n, rounds=None, backend=None):
+    """Test n for primality with trial division by the small primes followed by
+    Miller-Rabin with the first rounds primes as bases. This is only suitable
+    for candidates that were chosen at random, not by an adversary.
+
+    rounds: (optional) the number of Miller-Rabin rounds, by default chosen
+        based on the bit length of n
+    backend: (optional) the name of the big integer backend to compute with
+    """
+    if n < 2:
+        return False
+    if n % 2 == 0:
+        return n == 2
+    for p in small_primes:
+        if n % p == 0:
+            return n == p
+        if p * p > n:
+            return True
+    return _miller_rabin(n, rounds, backend)
+
+def _miller_rabin(n, rounds=None, backend=None):
+    """Miller-Rabin test of an odd n with no factors among the small primes"""
+    if rounds is None:
+        rounds = miller_rabin_rounds(n.bit_length())
+    powmod = get_backend(backend).powmod
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    for a in [2] + small_primes[:rounds - 1]:
+        x = powmod(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in xrange(r - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+def sieve(start, count, safe=False):
+    """Sieve the count odd candidates start, start+2, ..., start+2*(count-1)
+    (start must be odd) by the small primes, returning a bytearray with a 1 for
+    each candidate that survived. If safe is True, a candidate q only survives
+    if neither q nor 2*q+1 has a small factor.
+    """
+    retval = bytearray('\x01' * count)
+    for p in small_primes:
+        # offset i is candidate start + 2*i, so q = 0 (mod p) at the i with
+        # 2*i = -start (mod p)
+        half = (p + 1) // 2
+        first = (-start * half) % p
+        for i in xrange(first, count, p):
+            retval[i] = 0
+        if safe:
+            # 2*q+1 = 0 (mod p) at the i with 4*i = -(2*start+1) (mod p)
+            first = (-(2*start + 1) * half * half) % p
+            for i in xrange(first, count, p):
+                retval[i] = 0
+    # this also rules out the small primes themselves
+    return retval
+
+def search(start, count, safe=False, backend=None):
+    """Return the first of the count odd candidates from start that is a prime
+    (or, if safe is True, a prime q such that 2*q+1 is also prime), or None
+    """
+    for i, survived in enumerate(sieve(start, count, safe)):
+        if not survived:
+            continue
+        candidate = start + 2*i
+        if safe:
+            # a cheap Fermat test of 2*q+1 before the expensive tests of q
+            if get_backend(backend).powmod(2, 2*candidate, 2*candidate + 1) != 1:
+                continue
+            if _miller_rabin(candidate, backend=backend) \
+                   and _miller_rabin(2*candidate + 1, backend=backend):
+                return candidate
+        elif _miller_rabin(candidate, backend=backend):
+            return candidate
+    return None
+
+def _search_worker(args):
+    return search(*args)
+
+def random_prime(bits, random, safe=False, processes=None, window=None, backend=None):
+    """Generate a random prime of exactly the given bit length, with its top two
+    bits set so that the product of two such primes has exactly 2*bits bits
+
+    The primes are found by drawing a random odd starting point and sieving
+    the window of candidates that follow it, so the result is a deterministic
+    function of the state of random and the window, whether or not processes
+    are used.
+
+    bits: the bit length of the prime, at least 32
+    random: the source of randomness (e.g. a KeccakRandom instance)
+    safe: (optional) generate a safe prime p, one for which (p-1)/2 is also
+        prime, default False
+    processes: (optional) if given, test the window in parallel in a pool of
+        this many worker processes (0 for one per CPU)
+    window: (optional) the number of odd candidates after each starting point,
+        by default 4*bits (16*bits for safe primes)
+    backend: (optional) the name of the big integer backend to compute with
+    """
+    if bits < 32:
+        raise ValueError('bits must be at least 32')
+    if window is None:
+        window = 16*bits if safe else 4*bits
+    # for safe primes, search for q = (p-1)/2 which is one bit shorter
+    search_bits = bits - 1 if safe else bits
+    pool = None
+    if processes is not None:
+        pool = multiprocessing.Pool(processes or None)
+        chunk = -(-window // (4 * (processes or multiprocessing.cpu_count())))
+    try:
+        while True:
+            start = random.getrandbits(search_bits) | (3 << (search_bits - 2)) | 1
+            if pool is None:
+                found = search(start, window, safe, backend)
+            else:
+                chunks = [ (start + 2*offset, min(chunk, window - offset), safe, backend)
+                           for offset in xrange(0, window, chunk) ]
+                found = next(( result for result in pool.imap(_search_worker, chunks)
+                               if result is not None ), None)
+            # reject candidates that carried past the requested length
+            if found is not None and found.bit_length() == search_bits:
+                return 2*found + 1 if safe else found
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+__all__ = ['small_primes', 'miller_rabin_rounds', 'is_probable_prime', 'sieve', 'search',
+           'random_prime']
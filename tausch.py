@@ -1,15 +1,508 @@
 from damgaardjurik import *
+from intbytes import int2bytes, bytes2int
+from multiexp import multi_pow, FixedBaseCache
+from djcontext import context_for, minimal_s, routed_bound, reset_contexts
+from itertools import izip
 from numbers import Integral
+import cPickle
+import mmap
+import multiprocessing
 from threading import RLock
 
+def _terms(row, queue):
+    """Given a recipient's row of selectors and the queue of messages (both
+    indexed by user index), return the list of (index, selector, message)
+    triples for which both the selector and the message are present
+    """
+    return [ (index, selector, message)
+             for index, (selector, message) in enumerate(izip(row, queue))
+             if selector is not None and message is not None ]
+
+def _route_naive(recipient, terms, precomputed):
+    """Compute a recipient's output with one ciphertext multiplication per sender"""
+    retval = 0
+    for _, selector, message in terms:
+        retval += DamgaardJurikCiphertext(selector, recipient)*message
+    return retval
+
+def _route_multiexp(recipient, terms, precomputed):
+    """Compute a recipient's output as a single simultaneous multi-exponentiation"""
+    selectors = [ selector for _, selector, _ in terms ]
+    modulus = context_for(recipient.n, selectors, precomputed.backend).modulus
+    return DamgaardJurikCiphertext(multi_pow(selectors,
+                                             [ message for _, _, message in terms ],
+                                             modulus,
+                                             backend=precomputed.backend),
+                                   recipient)
+
+def _route_fixedbase(recipient, terms, precomputed):
+    """Compute a recipient's output using cached fixed-base tables of powers of
+    each selector, and multi_pow for the selectors that don't fit in the
+    cache's budget (see multiexp.FixedBaseCache)
+    """
+    selectors = [ selector for _, selector, _ in terms ]
+    modulus = context_for(recipient.n, selectors, precomputed.backend).modulus
+    return DamgaardJurikCiphertext(precomputed.multi_pow([ (recipient, index) for index, _, _ in terms ],
+                                                         selectors,
+                                                         [ message for _, _, message in terms ],
+                                                         modulus),
+                                   recipient)
+
+routing_backends = { 'naive':_route_naive,
+                     'multiexp':_route_multiexp,
+                     'fixedbase':_route_fixedbase }
+
+validation_levels = ('off', 'on-change', 'paranoid')
+
+snapshot_magic = 'TAUSCH\x00\x01'
+# the length of the pickled snapshot header
+snapshot_length_width = 8
+
+def _routing_worker(connection, backend, precompute_budget, bigint):
+    """Body of a RoutingPool worker process
+
+    Each task is a list of (token, recipient, length, changes) updates, a list
+    of the tokens of recipients that have been removed, and the queue. The
+    recipient is only given the first time its token is seen; after that its
+    row of selectors is resized to length and the (index, selector) changes
+    are applied to it. The reply is (True, [(token, output), ...]) with the
+    outputs as integers, or (False, exception).
+    """
+    # workers restarted after a failure are forked from whichever thread is
+    # routing, possibly while another thread holds the shared context lock
+    reset_contexts()
+    route = routing_backends[backend]
+    precomputed = FixedBaseCache(precompute_budget, backend=bigint)
+    recipients = dict()
+    rows = dict()
+    while True:
+        task = connection.recv()
+        if task is None:
+            return
+        updates, removed, queue = task
+        try:
+            for token in removed:
+                recipient = recipients.pop(token)
+                del rows[token]
+                precomputed.discard(lambda key: key[0] is recipient)
+            for token, recipient, length, changes in updates:
+                if recipient is not None:
+                    recipients[token] = recipient
+                    rows[token] = list()
+                row = rows[token]
+                del row[length:]
+                row.extend([None] * (length - len(row)))
+                for index, selector in changes:
+                    row[index] = selector
+            results = [ (token, int(route(recipient, _terms(rows[token], queue), precomputed)))
+                        for token, recipient in recipients.iteritems() ]
+        except Exception as e:
+            connection.send((False, e))
+        else:
+            connection.send((True, results))
+
+class RoutingPool(object):
+    """Class representing the worker processes used by a parallel TauschRouter,
+    kept for the lifetime of the router
+
+    Each recipient is assigned to one worker, which keeps the recipient's key
+    and row of selectors (and its fixed-base tables, for the 'fixedbase'
+    backend) from round to round. Each round a worker is only sent the queue
+    and the selectors that have changed since the last round it routed.
+
+    The workers are started when the pool is created, which should be before
+    any other threads use the router (AsyncTauschRouter creates its threads
+    after its router): a process forked while another thread holds a lock
+    inherits the lock held. They are restarted by route after a failure or
+    close, possibly on another thread, so each worker replaces the lock of
+    the djcontext cache, the only shared lock it uses (its FixedBaseCache is
+    its own).
+    """
+    def __init__(self, backend, processes=None, precompute_budget=64*2**20, bigint=None):
+        """backend: the name of the routing backend
+        processes: (optional) the number of worker processes, defaults to the
+            number of CPUs
+        precompute_budget: (optional) the approximate number of bytes of
+            fixed-base tables kept by all of the workers together, default 64MiB
+        bigint: (optional) the name of the big integer backend
+        """
+        self.backend = backend
+        self.processes = processes or multiprocessing.cpu_count()
+        self.precompute_budget = precompute_budget
+        self.bigint = bigint
+        self.lock = RLock()
+        with self.lock:
+            # workers is a list of (process, connection) pairs, or None when
+            # they are not running. assigned maps each recipient to its token
+            # and the number of its worker, and sent maps it to the row of
+            # selectors that its worker holds.
+            self.workers = None
+            self.assigned = dict()
+            self.sent = dict()
+            self.next_token = 0
+            self._start()
+
+    def _start(self):
+        with self.lock:
+            self.workers = list()
+            self.assigned = dict()
+            self.sent = dict()
+            for _ in xrange(self.processes):
+                connection, child_connection = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=_routing_worker,
+                                                  args=(child_connection, self.backend,
+                                                        self.precompute_budget // self.processes,
+                                                        self.bigint))
+                process.daemon = True
+                process.start()
+                child_connection.close()
+                self.workers.append((process, connection))
+
+    def route(self, recipients, rows, queue):
+        """Compute the outputs of the given recipients, each with the
+        corresponding row of selectors, returning a dict of recipient ->
+        DamgaardJurikCiphertext. Recipients that are absent from one call are
+        forgotten by the workers.
+        """
+        with self.lock:
+            if self.workers is None:
+                self._start()
+            try:
+                return self._route(recipients, rows, queue)
+            except:
+                # the workers' state is unknown, so start afresh next time
+                self._stop(terminate=True)
+                raise
+
+    def _route(self, recipients, rows, queue):
+        updates = [ list() for _ in self.workers ]
+        removed = [ list() for _ in self.workers ]
+        current = frozenset(recipients)
+        for recipient in self.assigned.keys():
+            if recipient not in current:
+                token, worker = self.assigned.pop(recipient)
+                del self.sent[recipient]
+                removed[worker].append(token)
+        loads = [0] * len(self.workers)
+        for _, worker in self.assigned.itervalues():
+            loads[worker] += 1
+
+        for recipient, row in izip(recipients, rows):
+            if recipient in self.assigned:
+                token, worker = self.assigned[recipient]
+                old = self.sent[recipient]
+                changes = [ (index, selector) for index, selector in enumerate(row)
+                            if index >= len(old) or old[index] != selector ]
+                if changes or len(row) != len(old):
+                    updates[worker].append((token, None, len(row), changes))
+            else:
+                worker = loads.index(min(loads))
+                loads[worker] += 1
+                token = self.next_token
+                self.next_token += 1
+                self.assigned[recipient] = (token, worker)
+                updates[worker].append((token, recipient, len(row),
+                                        [ (index, selector) for index, selector in enumerate(row)
+                                          if selector is not None ]))
+            self.sent[recipient] = row
+
+        for (_, connection), worker_updates, worker_removed in izip(self.workers, updates, removed):
+            connection.send((worker_updates, worker_removed, queue))
+        tokens = dict( (token, recipient) for recipient, (token, _) in self.assigned.iteritems() )
+        retval = dict()
+        for _, connection in self.workers:
+            succeeded, results = connection.recv()
+            if not succeeded:
+                raise results
+            for token, result in results:
+                recipient = tokens[token]
+                retval[recipient] = DamgaardJurikCiphertext(result, recipient)
+        return retval
+
+    def _stop(self, terminate=False):
+        with self.lock:
+            if self.workers is None:
+                return
+            for process, connection in self.workers:
+                if terminate:
+                    process.terminate()
+                else:
+                    try:
+                        connection.send(None)
+                    except (EnvironmentError, ValueError):
+                        process.terminate()
+            for process, connection in self.workers:
+                process.join()
+                connection.close()
+            self.workers = None
+
+    def close(self):
+        """Stop the worker processes. They are started again if needed, so
+        only call this from the thread that owns the router, once no other
+        thread is using it.
+        """
+        self._stop()
+
+class SnapshotRow(object):
+    """Class representing a recipient's row of selectors in a snapshot being
+    restored (see TauschRouter.restore), which is only decoded from the
+    snapshot data when it is first used. The snapshot data, usually a memory
+    map, is released once every row that refers to it has been decoded.
+    """
+    def __init__(self, data, offset, width, present):
+        """data: the snapshot data, a string or mmap
+        offset: the offset of the row in data
+        width: the width in bytes of each selector, 0 if there are none
+        present: a sequence of booleans, whether each index had a member
+        """
+        self.data = data
+        self.offset = offset
+        self.width = width
+        self.present = present
+        self.row = None
+
+    @property
+    def decoded(self):
+        return self.row is not None
+
+    def _decode(self):
+        if self.row is None:
+            row = [None] * len(self.present)
+            if self.width:
+                for index, present in enumerate(self.present):
+                    if not present:
+                        continue
+                    start = self.offset + index*self.width
+                    selector = bytes2int(self.data[start:start+self.width])
+                    if selector:
+                        row[index] = selector
+            self.row = row
+            self.data = None
+        return self.row
+
+    def __len__(self):
+        return len(self._decode())
+
+    def __iter__(self):
+        return iter(self._decode())
+
+    def __getitem__(self, index):
+        return self._decode()[index]
+
+    def __setitem__(self, index, selector):
+        self._decode()[index] = selector
+
+    def append(self, selector):
+        self._decode().append(selector)
+
+    def pop(self):
+        return self._decode().pop()
+
+class FrozenRound(object):
+    """Class representing a snapshot of one round of a TauschRouter, which is
+    routed independently of any later changes to the router
+    """
+    def __init__(self, router, epoch, recipients, rows, queue, outputs=None):
+        self.backend = router.backend
+        self.routing_pool = router.routing_pool
+        self.precomputed = router.precomputed
+        self.epoch = epoch
+        self.recipients = recipients
+        self.rows = rows
+        self.queue = queue
+        self.outputs = outputs
+
+    def route(self):
+        """Perform the routing operation, returning a dict of user -> message
+        Where user (a DamgaardJurik instance) is the recipient of the message
+        (a DamgaardJurikCiphertext instance)
+        """
+        if self.outputs is None:
+            if self.routing_pool is not None:
+                self.outputs = self._route_parallel()
+            else:
+                route = routing_backends[self.backend]
+                self.outputs = dict( (recipient, route(recipient, _terms(row, self.queue), self.precomputed))
+                                     for recipient, row in izip(self.recipients, self.rows) )
+        return self.outputs
+
+    def _route_parallel(self):
+        """Compute the outputs in the router's pool of worker processes"""
+        if not self.recipients:
+            return dict()
+        return self.routing_pool.route(self.recipients, self.rows, self.queue)
+
 class TauschRouter(object):
     """Class representing the blinded routing operation that can be performed based on Damgaard Jurik"""
-    def __init__(self):
+    def __init__(self, backend='naive', parallel=False, processes=None, incremental=False,
+                 precompute_budget=64*2**20, slot_width=None, slot_count=1, max_users=None,
+                 validation='on-change', bigint=None, message_bits=None):
+        """backend: (optional) the name of the routing backend (a key of
+            routing_backends) used to compute each recipient's output,
+            default 'naive'
+        parallel: (optional) compute the recipients' outputs in a pool of
+            worker processes (see RoutingPool) that is started with the router
+            and kept until close is called, default False
+        processes: (optional) the number of worker processes to use when
+            parallel is True, defaults to the number of CPUs
+        incremental: (optional) fold each message into every recipient's output
+            as soon as it is queued, so that route_messages only has to hand
+            out the finished outputs, default False
+        precompute_budget: (optional) the approximate number of bytes of
+            precomputed powers of selectors kept by the 'fixedbase' backend,
+            default 64MiB. Selectors beyond the budget are routed as by the
+            'multiexp' backend.
+        slot_width: (optional) if given, each message is a sequence of up to
+            slot_count integers of at most slot_width bits, packed into
+            separate slots of a single plaintext so that they are all routed
+            together. Recipients recover the slots from the decrypted output
+            with unpack_slots. Default None, messages are single integers.
+        slot_count: (optional) the number of slots in each message, default 1
+        max_users: (optional) the maximum number of users of this router,
+            beyond which add_user refuses new users. Required if slot_width
+            is given so that the slots are wide enough to hold the sum of
+            every sender's contribution without overflow. Also bounds the
+            routed sums when message_bits is given.
+        validation: (optional) when to run the full consistency check of the
+            router's state before routing: 'off' never does, 'on-change' does
+            when users or subscriptions have changed since the last check and
+            'paranoid' does every round, default 'on-change'. Subscriptions are
+            always checked when they are given to the router, and rounds with
+            missing selectors are always refused.
+        bigint: (optional) the name of the big integer backend (see
+            bigint.get_backend) used by the 'multiexp' and 'fixedbase'
+            backends, default None, the default backend
+        message_bits: (optional) if given, messages (or, if slot_width is
+            given, each slot value) must be non-negative integers of at most
+            this many bits, and selectors are checked to be encrypted with an
+            s large enough that the routed sums can't overflow (see
+            required_s). Without max_users that bound grows with the number
+            of users, and add_user refuses a user whose joining would make a
+            selector already given too small. Default None, unchecked.
+        """
+        if backend not in routing_backends:
+            raise ValueError('Unknown routing backend %s' % repr(backend))
+        if validation not in validation_levels:
+            raise ValueError('Unknown validation level %s' % repr(validation))
+        if slot_width is not None:
+            if max_users is None:
+                raise ValueError('max_users is required when slot_width is given')
+            if slot_width < 1 or slot_count < 1 or max_users < 1:
+                raise ValueError('slot_width, slot_count and max_users must be positive')
+        self.slot_width = slot_width
+        self.slot_count = slot_count
+        self.max_users = max_users
+        self.message_bits = message_bits
+        self.backend = backend
+        self.parallel = parallel
+        self.processes = processes
+        self.incremental = incremental
+        self.validation = validation
         self.lock = RLock()
         with self.lock:
+            # every user is assigned an index. members maps indices to users
+            # (None for vacated indices) and indices maps users to indices.
+            # table maps each recipient to its row of selectors (integers, or
+            # None where no selector has been given yet) and queue holds the
+            # messages for this round (None where none has been queued), all
+            # indexed by user index. missing counts the selectors that have
+            # not been given yet in each recipient's row.
+            self.members = list()
+            self.indices = dict()
             self.table = dict()
-            self.queue = dict()
+            self.missing = dict()
+            # version is incremented on every change of users or subscriptions
+            self.version = 0
+            self.validated = None
+            self.queue = list()
+            self.queued = 0
+            self.epoch = 0
+            # the running outputs (ciphertext values) of incremental routing
+            self.accumulators = dict()
+            self.precomputed = FixedBaseCache(precompute_budget, backend=bigint)
             self.modification_callbacks = dict()
+        self.routing_pool = None
+        if parallel:
+            self.routing_pool = RoutingPool(backend, processes, precompute_budget, bigint)
+
+    def close(self):
+        """Stop the routing worker processes, if any. They are started again
+        if the router is used afterwards, so only call this from the thread
+        that owns the router, once no other thread is using it (see
+        RoutingPool).
+        """
+        if self.routing_pool is not None:
+            self.routing_pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def slot_stride(self):
+        """The distance in bits between the slots of a packed message: the slot
+        width plus enough guard bits that max_users contributions can't carry
+        into the next slot
+        """
+        if self.slot_width is None:
+            return None
+        return self.slot_width + self.max_users.bit_length()
+
+    def pack_slots(self, values):
+        """Given a sequence of up to slot_count integers, each less than
+        2**slot_width (and 2**message_bits, if given), return the packed
+        message
+        """
+        if self.slot_width is None:
+            raise RuntimeError('This router does not use packed messages')
+        values = list(values)
+        if len(values) > self.slot_count:
+            raise ValueError('Too many slots, at most %d are allowed' % self.slot_count)
+        bits = self.slot_width
+        if self.message_bits is not None:
+            bits = min(bits, self.message_bits)
+        retval = 0
+        for i, value in enumerate(values):
+            if not isinstance(value, Integral):
+                raise TypeError('Slot values must be integers')
+            if value < 0 or value >> bits:
+                raise ValueError('Slot value must be between 0 and 2**%d - 1' % bits)
+            retval |= value << (i * self.slot_stride)
+        return retval
+
+    def unpack_slots(self, message):
+        """Given a decrypted routed message (an integer or a
+        DamgaardJurikPlaintext), return the tuple of slot_count slot values
+        """
+        if self.slot_width is None:
+            raise RuntimeError('This router does not use packed messages')
+        message = int(message)
+        mask = (1 << self.slot_stride) - 1
+        return tuple( (message >> (i * self.slot_stride)) & mask
+                      for i in xrange(self.slot_count) )
+
+    def required_s(self, user, senders=None):
+        """The smallest s with which the given user's selectors can be
+        encrypted without the routed sums overflowing the plaintext space, or
+        None if this router doesn't bound the size of messages. Encrypting with
+        a larger s only wastes bandwidth and computation.
+
+        senders: (optional) the number of senders to allow for, default
+            max_users, or the current number of users if it isn't given
+        """
+        if self.slot_width is not None:
+            # the guard bits in each slot already account for max_users senders
+            bound = 1 << (self.slot_count * self.slot_stride)
+        elif self.message_bits is not None:
+            if senders is None:
+                with self.lock:
+                    senders = self.max_users if self.max_users is not None else len(self.indices)
+            bound = routed_bound(self.message_bits, max(senders, 1))
+        else:
+            return None
+        return minimal_s(user.n, bound)
 
     def _check_user(self, user):
         """Given a user (a DamgaardJurik instance) check that the user is participating in this router"""
@@ -18,66 +511,207 @@ class TauschRouter(object):
         with self.lock:
             if user not in self.table:
                 raise KeyError('Unknown user')
-    def _check_subscription(self, subscription):
-        """Given a subscription, check that it is well-formed for this particular router"""
-        # check types
-        for sender, selector in subscription.iteritems():
+    def _check_selectors(self, selectors, recipient=None):
+        """Given a (partial) subscription, check that its types are correct and
+        that all of its senders are participating in this router. If the
+        recipient is given, also check that the selectors' s is large enough.
+        """
+        for sender, selector in selectors.iteritems():
             if not isinstance(sender, DamgaardJurik) or not isinstance(selector, DamgaardJurikCiphertext):
                 raise TypeError('subscription must be a dict DamgaardJurik -> DamgaardJurikCiphertext')
+        with self.lock:
+            for sender in selectors.iterkeys():
+                if sender not in self.indices:
+                    raise KeyError('Mismatch between subscription users and routing table users')
+            if recipient is not None:
+                self._check_selector_s(recipient, [ int(selector) for selector in selectors.itervalues() ])
+    def _check_selector_s(self, recipient, selectors, senders=None):
+        """Given a recipient and some of its selectors (integers), check that
+        they were encrypted with at least the required s (for the given number
+        of senders, see required_s)
+        """
+        s = self.required_s(recipient, senders)
+        if s is None or s == 1:
+            return
+        for selector in selectors:
+            if context_for(recipient.n, [selector]).s < s:
+                raise ValueError('Selector was encrypted with too small an s, routed messages could overflow; use s=%d' % s)
+    def _check_subscription(self, subscription, recipient=None):
+        """Given a subscription, check that it is well-formed for this particular router"""
+        self._check_selectors(subscription, recipient)
         # check that the users in the subscription are exactly correct
         with self.lock:
-            if frozenset(subscription.iterkeys()) != frozenset(self.table.iterkeys()):
+            if len(subscription) != len(self.indices):
                 raise KeyError('Mismatch between subscription users and routing table users')
     def _check_consistency(self):
         """Check that all the state of this router is consistent"""
         with self.lock:
-            for subscription in self.table.itervalues():
-                self._check_subscription(subscription)
+            if len(self.queue) != len(self.members) \
+                   or any( self.members[index] is not user
+                           for user, index in self.indices.iteritems() ):
+                raise KeyError('Mismatch between user indices and members')
+            for row in self.table.itervalues():
+                if len(row) != len(self.members) \
+                       or any( (member is None) != (selector is None)
+                               for member, selector in izip(self.members, row) ):
+                    raise KeyError('Mismatch between subscription users and routing table users')
+            if frozenset(self.table.iterkeys()) != frozenset(self.indices.iterkeys()):
+                raise KeyError('Mismatch between routing table users and user indices')
+            if frozenset(self.missing.iterkeys()) != frozenset(self.table.iterkeys()) \
+                   or any(self.missing.itervalues()):
+                raise KeyError('Mismatch between missing selector counts and routing table')
             if frozenset(self.modification_callbacks.iterkeys()) != frozenset(self.table.iterkeys()):
                 raise KeyError('Mismatch between callbacks users and routing table users')
+            # the required s may have grown as users joined
+            for recipient, row in self.table.iteritems():
+                self._check_selector_s(recipient, [ selector for selector in row if selector is not None ])
 
 
     def queue_message(self, user, message):
         """Queue a message (an integer) from the given user (a DamgaardJurik instance)
         to be routed on the next round
+
+        If this router uses packed messages, message is instead a sequence of
+        slot values (see pack_slots)
         """
-        if not isinstance(message, Integral):
+        if self.slot_width is not None:
+            # each slot is checked against message_bits before packing, since
+            # the packed message is much longer
+            message = self.pack_slots(message)
+        elif not isinstance(message, Integral):
             raise TypeError('Argument message must be an integer')
+        elif self.message_bits is not None and (message < 0 or message >> self.message_bits):
+            raise ValueError('Argument message must be between 0 and 2**%d - 1' % self.message_bits)
 
         with self.lock:
             self._check_user(user)
-            if user in self.queue:
+            index = self.indices[user]
+            if self.queue[index] is not None:
                 raise KeyError('User has already submitted a message for this round')
-            self.queue[user] = message
-            return len(self.queue) == len(self.table)
+            self.queue[index] = message
+            self.queued += 1
+            if self.incremental:
+                for recipient, row in self.table.iteritems():
+                    if row[index] is not None:
+                        self._fold(recipient, self._route_terms(recipient, [(index, row[index], message)]))
+            return self.queued == len(self.indices)
+
+    def _fold(self, recipient, contribution, subtract=False):
+        """Add (or subtract) a contribution (a DamgaardJurikCiphertext) to the
+        running output of the given recipient
+
+        The running outputs are kept as bare integers and combined using the
+        shared context for the recipient's key, to avoid building a ciphertext
+        object for each of the N**2 folds in a round.
+        """
+        contribution = int(contribution)
+        with self.lock:
+            accumulator = self.accumulators.get(recipient)
+            values = [contribution] if accumulator is None else [contribution, accumulator]
+            context = context_for(recipient.n, values, self.precomputed.backend)
+            if subtract:
+                contribution = context.negate(contribution)
+            if accumulator is not None:
+                contribution = context.add(accumulator, contribution)
+            self.accumulators[recipient] = contribution
+    def _route_terms(self, recipient, terms):
+        """Compute a recipient's output over the given (index, selector, message) triples"""
+        return routing_backends[self.backend](recipient, terms, self.precomputed)
+    def _reaccumulate(self, recipient):
+        """Recompute the running output of the given recipient from scratch
+        using the messages queued so far
+        """
+        with self.lock:
+            self.accumulators.pop(recipient, None)
+            terms = _terms(self.table[recipient], self.queue)
+            if terms:
+                self.accumulators[recipient] = int(self._route_terms(recipient, terms))
 
 
+    def freeze_round(self):
+        """Close the current round and return a FrozenRound holding a snapshot
+        of the routing table and queue. Submissions and membership changes for
+        the next round may proceed immediately, while the frozen round is
+        routed outside of the lock.
+        """
+        with self.lock:
+            if self.validation == 'paranoid' \
+                   or (self.validation == 'on-change' and self.validated != self.version):
+                self._check_consistency()
+                self.validated = self.version
+            elif any(self.missing.itervalues()):
+                raise KeyError('Mismatch between subscription users and routing table users')
+            if self.queued != len(self.indices):
+                raise RuntimeError('Not all users have submitted messages')
+            recipients = self.table.keys()
+            if self.incremental:
+                for recipient in recipients:
+                    if recipient not in self.accumulators:
+                        self._reaccumulate(recipient)
+                outputs = dict( (recipient, DamgaardJurikCiphertext(accumulator, recipient))
+                                for recipient, accumulator in self.accumulators.iteritems() )
+                self.accumulators = dict()
+                rows = None
+            else:
+                outputs = None
+                rows = [ list(self.table[recipient]) for recipient in recipients ]
+            retval = FrozenRound(self, self.epoch, recipients, rows, self.queue, outputs)
+            self._clear_queue()
+            self.epoch += 1
+            return retval
+
     def route_messages(self):
         """Perform the routing operation, returning a dict of user -> message
         Where user (a DamgaardJurik instance) is the recipient of the message
         (a DamgaardJurikCiphertext instance)
         """
+        return self.freeze_round().route()
+
+    def _clear_queue(self):
         with self.lock:
-            self._check_consistency()
-            for user in self.table.iterkeys():
-                if user not in self.queue:
-                    raise RuntimeError('Not all users have submitted messages')
-            retval = dict()
-            for recipient, subscription in self.table.iteritems():
-                retval[recipient] = 0
-                for sender, selector in subscription.iteritems():
-                    retval[recipient] += selector*self.queue[sender]
-            self.queue = dict()
-            return retval
+            self.queue = [None] * len(self.members)
+            self.queued = 0
 
 
     def update_subscription(self, user, subscription):
         """Replace the current subscription for the given user with the given subscription"""
         with self.lock:
             self._check_user(user)
-            self._check_subscription(subscription)
+            self._check_subscription(subscription, user)
 
-            self.table[user] = subscription
+            row = [None] * len(self.members)
+            for sender, selector in subscription.iteritems():
+                row[self.indices[sender]] = int(selector)
+            self.table[user] = row
+            self.missing[user] = 0
+            self.version += 1
+            self.precomputed.discard(lambda key: key[0] == user)
+            if self.incremental:
+                self._reaccumulate(user)
+
+    def update_selectors(self, user, selectors):
+        """Replace some of the selectors in the current subscription for the
+        given user. selectors is a dict DamgaardJurik -> DamgaardJurikCiphertext
+        of only the senders to be replaced, e.g. a user that has just joined.
+        """
+        with self.lock:
+            self._check_user(user)
+            self._check_selectors(selectors, user)
+
+            row = self.table[user]
+            for sender, selector in selectors.iteritems():
+                index = self.indices[sender]
+                selector = int(selector)
+                message = self.queue[index]
+                if self.incremental and message is not None:
+                    if row[index] is not None:
+                        self._fold(user, self._route_terms(user, [(index, row[index], message)]), subtract=True)
+                    self._fold(user, self._route_terms(user, [(index, selector, message)]))
+                if row[index] is None:
+                    self.missing[user] -= 1
+                row[index] = selector
+                self.precomputed.discard(lambda key: key == (user, index))
+            self.version += 1
 
 
     def add_user(self, user, callback):
@@ -86,9 +720,40 @@ class TauschRouter(object):
             try: self._check_user(user)
             except: pass
             else: raise KeyError('User already exists')
+            if self.max_users is not None and len(self.indices) >= self.max_users:
+                raise RuntimeError('Router already has max_users users')
+            if self.slot_width is not None:
+                # leave the top bit clear so the sum isn't mistaken for a negative plaintext
+                if self.slot_count * self.slot_stride >= user.n.bit_length() - 1:
+                    raise ValueError('Packed messages do not fit in the plaintext space of this user\'s key')
+            elif self.message_bits is not None and self.max_users is None:
+                # without max_users the bound on the routed sums grows with
+                # every user, so check the selectors already given here rather
+                # than leave it to _check_consistency, which validation='off'
+                # never runs. They were checked for the current number of
+                # senders, so only recipients whose required s grows need it.
+                senders = len(self.indices) + 1
+                for recipient, row in self.table.iteritems():
+                    if self.required_s(recipient, senders) != self.required_s(recipient, senders - 1):
+                        self._check_selector_s(recipient, [ selector for selector in row if selector is not None ],
+                                               senders)
 
+            if len(self.indices) < len(self.members):
+                index = self.members.index(None)
+                self.members[index] = user
+            else:
+                index = len(self.members)
+                self.members.append(user)
+                self.queue.append(None)
+                for row in self.table.itervalues():
+                    row.append(None)
+            for recipient in self.table.iterkeys():
+                self.missing[recipient] += 1
+            self.indices[user] = index
             self.modification_callbacks[user] = callback
-            self.table[user] = dict()
+            self.table[user] = [None] * len(self.members)
+            self.missing[user] = len(self.indices)
+            self.version += 1
             callbacks = self.modification_callbacks.values()
         for callback in callbacks:
             callback('add', user)
@@ -98,19 +763,152 @@ class TauschRouter(object):
         """Delete a user from the router"""
         with self.lock:
             self._check_user(user)
-            self.queue.pop(user, None)
+            index = self.indices.pop(user)
+            message = self.queue[index]
+            self.queue[index] = None
+            if message is not None:
+                self.queued -= 1
+            self.members[index] = None
             self.table.pop(user, None)
+            self.missing.pop(user, None)
+            self.version += 1
+            self.accumulators.pop(user, None)
+            if self.incremental and message is not None:
+                # remove the user's message from everybody else's output
+                for recipient, row in self.table.iteritems():
+                    if row[index] is not None:
+                        self._fold(recipient, self._route_terms(recipient, [(index, row[index], message)]), subtract=True)
+            self.precomputed.discard(lambda key: key[0] == user or key[1] == index)
             self.modification_callbacks.pop(user, None)
-            for subscription in self.table.itervalues():
-                subscription.pop(user, None)
+            for recipient, row in self.table.iteritems():
+                if row[index] is None:
+                    self.missing[recipient] -= 1
+                row[index] = None
+            # keep the rows compact by dropping vacated indices from the end
+            while self.members and self.members[-1] is None:
+                self.members.pop()
+                self.queue.pop()
+                for row in self.table.itervalues():
+                    row.pop()
             callbacks = self.modification_callbacks.values()
         for callback in callbacks:
             callback('del', user)
         # self._check_consistency()
 
+    def snapshot(self, f):
+        """Write the routing table, membership and pending queue of this router
+        to the file object f
+
+        The (small) header holding the users and queued messages is pickled.
+        Each recipient's row of selectors follows as fixed-width big-endian
+        integers, with missing selectors written as zero.
+        """
+        with self.lock:
+            widths = list()
+            for index, recipient in enumerate(self.members):
+                if recipient is None:
+                    widths.append(None)
+                    continue
+                present = [ selector for selector in self.table[recipient] if selector is not None ]
+                if present:
+                    widths.append(context_for(recipient.n, present).width)
+                else:
+                    widths.append(0)
+            header = cPickle.dumps({ 'members':self.members,
+                                     'queue':self.queue,
+                                     'epoch':self.epoch,
+                                     'widths':widths,
+                                     'missing':[ self.missing.get(member) for member in self.members ] }, -1)
+            f.write(snapshot_magic)
+            f.write(int2bytes(len(header), snapshot_length_width))
+            f.write(header)
+            for recipient, width in izip(self.members, widths):
+                if recipient is None or not width:
+                    continue
+                missing = '\x00' * width
+                f.write(''.join( missing if selector is None else int2bytes(selector, width)
+                                 for selector in self.table[recipient] ))
+
+    @classmethod
+    def restore(cls, f, callback_factory, **router_args):
+        """Create a router from a snapshot written by TauschRouter.snapshot
+
+        Only the header is read straight away. Each recipient's row of
+        selectors is decoded from the snapshot when it is first used (see
+        SnapshotRow), so restoring a large router is quick.
+
+        f: a filename or file object holding the snapshot. Regular files are
+            memory mapped rather than read into memory, and the map is kept
+            until every row has been decoded.
+        callback_factory: a function taking a user and returning that user's
+            status update callback (see add_user)
+        router_args: the arguments for the new router (see __init__)
+        """
+        if isinstance(f, basestring):
+            with open(f, 'rb') as f:
+                return cls.restore(f, callback_factory, **router_args)
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, EnvironmentError, ValueError):
+            data = f.read()
+        return cls._restore(data, callback_factory, router_args)
+
+    @classmethod
+    def _restore(cls, data, callback_factory, router_args):
+        if data[:len(snapshot_magic)] != snapshot_magic:
+            raise ValueError('Not a TauschRouter snapshot')
+        offset = len(snapshot_magic)
+        header_length = bytes2int(data[offset:offset+snapshot_length_width])
+        offset += snapshot_length_width
+        header = cPickle.loads(data[offset:offset+header_length])
+        offset += header_length
+
+        self = cls(**router_args)
+        with self.lock:
+            self.members = header['members']
+            self.queue = header['queue']
+            self.epoch = header['epoch']
+            if len(self.queue) != len(self.members):
+                raise ValueError('Corrupt TauschRouter snapshot')
+            present = tuple( member is not None for member in self.members )
+            missing = header.get('missing')
+            for index, (recipient, width) in enumerate(izip(self.members, header['widths'])):
+                if recipient is None:
+                    continue
+                row = SnapshotRow(data, offset, width, present)
+                offset += width * len(self.members)
+                self.indices[recipient] = index
+                self.table[recipient] = row
+                if missing is not None:
+                    self.missing[recipient] = missing[index]
+                else:
+                    self.missing[recipient] = sum( 1 for sender_present, selector in izip(present, row)
+                                                   if sender_present and selector is None )
+                self.modification_callbacks[recipient] = callback_factory(recipient)
+            if offset != len(data):
+                raise ValueError('Corrupt TauschRouter snapshot')
+            self.queued = sum( message is not None for message in self.queue )
+            self.version += 1
+            if self.incremental:
+                for recipient in self.table.iterkeys():
+                    self._reaccumulate(recipient)
+        return self
+
+    @property
+    def ready(self):
+        """Whether every user has submitted a message for this round"""
+        with self.lock:
+            return bool(self.indices) and self.queued == len(self.indices)
+
+    def pending_users(self):
+        """Return the set of users that have not submitted a message for this round"""
+        with self.lock:
+            return frozenset( user for user, index in self.indices.iteritems()
+                              if self.queue[index] is None )
+
     @property
     def users(self):
         with self.lock:
             return frozenset(self.table.iterkeys())
 
-__all__ = ['TauschRouter']
+__all__ = ['TauschRouter', 'FrozenRound', 'RoutingPool', 'SnapshotRow', 'routing_backends', 'validation_levels']
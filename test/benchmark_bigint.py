@@ -0,0 +1,79 @@
+import os.path
+import sys
+bigfiles_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bigfiles')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cPickle
+from time import time
+
+from bigint import *
+from multiexp import multi_pow
+import keccak
+import damgaardjurik as dj
+
+ss = [1, 2, 3, 4]
+repetitions = 8
+num_bases = 16
+seed = ''
+
+def best_time(function, args_list):
+    """Return the shortest time taken by function over each of args_list"""
+    best = None
+    for args in args_list:
+        start = time()
+        function(*args)
+        elapsed = time() - start
+        best = min(best, elapsed) if best is not None else elapsed
+    return best
+
+def benchmark(key, s, random):
+    """Time encrypt, decrypt, homomorphic addition and scalar multiplication
+    with the given key and s using the damgaardjurik module's current
+    arithmetic, returning a list of times
+    """
+    bits = key.n.bit_length() * s // 2
+    plaintexts = [ dj.DamgaardJurikPlaintext(random.getrandbits(bits)) for _ in xrange(repetitions) ]
+    ciphertexts = [ key.encrypt(plaintext, s=s, random=random, ciphertext_args={'cache':False})
+                    for plaintext in plaintexts ]
+    scalars = [ random.getrandbits(32) for _ in xrange(repetitions) ]
+    return [ best_time(lambda p: key.encrypt(p, s=s, random=random, ciphertext_args={'cache':False}),
+                       [ (p,) for p in plaintexts ]),
+             best_time(key.decrypt, [ (c,) for c in ciphertexts ]),
+             best_time(lambda a, b: a + b, zip(ciphertexts, reversed(ciphertexts))),
+             best_time(lambda c, k: c * k, zip(ciphertexts, scalars)) ]
+
+def benchmark_multi_pow(key, s, random):
+    """Time multi_pow of num_bases ciphertexts with each big integer backend,
+    returning a list of times in the order of sorted(bigint_backends)
+    """
+    modulus = key.n**(s+1)
+    bases = [ random.randrange(modulus) for _ in xrange(num_bases) ]
+    exponents = [ random.getrandbits(32) for _ in xrange(num_bases) ]
+    return [ best_time(multi_pow, [(bases, exponents, modulus, None, backend)] * repetitions)
+             for backend in sorted(bigint_backends.iterkeys()) ]
+
+if __name__ == '__main__':
+    sample_keys = cPickle.Unpickler(open(os.path.join(bigfiles_path, 'sample_keys.pkl'),'rb')).load()
+    random = keccak.KeccakRandom(seed)
+    dj_modes = [False, True] if dj.has_gmpy else [False]
+    operations = ['encrypt', 'decrypt', 'add', 'scalar']
+    print 'active backends: %s' % repr(active_backends())
+    print 'keylen s ' \
+          + ' '.join('%16s' % ('%s/%s' % (operation, 'gmpy' if mode else 'python'))
+                     for mode in dj_modes for operation in operations) \
+          + ' ' + ' '.join('%16s' % ('multi_pow/' + backend) for backend in sorted(bigint_backends.iterkeys()))
+    saved_has_gmpy = dj.has_gmpy
+    try:
+        for (keylen, key_seed), users in sorted(sample_keys.iteritems()):
+            if key_seed != seed:
+                continue
+            for s in ss:
+                times = list()
+                for mode in dj_modes:
+                    dj.has_gmpy = mode
+                    times += benchmark(users[0], s, random)
+                dj.has_gmpy = saved_has_gmpy
+                times += benchmark_multi_pow(users[0], s, random)
+                print '%6d %1d ' % (keylen, s) + ' '.join('%15.6fs' % t for t in times)
+    finally:
+        dj.has_gmpy = saved_has_gmpy
@@ -0,0 +1,78 @@
+import os.path
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from time import time
+
+from keccakf import *
+from keccakrandom import BufferedKeccakRandom
+import keccak
+
+keccak_argss = [ {'r':1088, 'c':512},
+                 {'r':576, 'c':1024},
+                 {'r':1344, 'c':256} ]
+lengths = [2**12, 2**16]
+repetitions = 3
+# messages hashed at once by hash_many, and their length in bytes
+num_messages = 1024
+message_length = 1024
+# small values drawn from each random number generator, and their width
+num_draws = 2**14
+draw_bits = 8
+seed = ''
+
+def best_time(function, args_list):
+    """Return the shortest time taken by function over each of args_list"""
+    best = None
+    for args in args_list:
+        start = time()
+        function(*args)
+        elapsed = time() - start
+        best = min(best, elapsed) if best is not None else elapsed
+    return best
+
+def hash_once(engine, keccak_args, data):
+    k = engine(fixed_out=True, **keccak_args)
+    k.absorb(data)
+    return k.squeeze(32)
+
+def benchmark(keccak_args, length, random):
+    """Time hashing length bytes with each Keccak engine, returning a list of
+    throughputs in MB/s in the order of sorted(keccak_engines)
+    """
+    data = ''.join( chr(random.getrandbits(8)) for _ in xrange(length) )
+    return [ length / best_time(hash_once, [(keccak_engines[name], keccak_args, data)] * repetitions) / 2**20
+             for name in sorted(keccak_engines.iterkeys()) ]
+
+def benchmark_many(keccak_args, random):
+    """Time hash_many of num_messages messages, returning the throughput in
+    MB/s
+    """
+    messages = [ ''.join( chr(random.getrandbits(8)) for _ in xrange(message_length) )
+                 for _ in xrange(num_messages) ]
+    elapsed = best_time(hash_many, [(messages, keccak_args['r'], keccak_args['c'], 32)] * repetitions)
+    return num_messages * message_length / elapsed / 2**20
+
+def benchmark_random(cls):
+    """Time num_draws calls of getrandbits(draw_bits) on a new instance of
+    cls, returning the number of values drawn per second
+    """
+    random = cls(seed)
+    draw = random.getrandbits
+    return num_draws / best_time(lambda: [ draw(draw_bits) for _ in xrange(num_draws) ], [()] * repetitions)
+
+if __name__ == '__main__':
+    random = keccak.KeccakRandom(seed)
+    print '   r    c   length ' + ' '.join('%16s' % name for name in sorted(keccak_engines.iterkeys())) \
+          + (' %16s' % 'hash_many' if has_numpy else '')
+    for keccak_args in keccak_argss:
+        for length in lengths:
+            rates = benchmark(keccak_args, length, random)
+            if has_numpy:
+                rates.append(benchmark_many(keccak_args, random))
+            print '%4d %4d %8d ' % (keccak_args['r'], keccak_args['c'], length) \
+                  + ' '.join('%11.3f MB/s' % rate for rate in rates)
+    print
+    print '%d bit draws per second' % draw_bits
+    for cls in [keccak.KeccakRandom, BufferedKeccakRandom]:
+        print '%20s %12.0f' % (cls.__name__, benchmark_random(cls))
@@ -0,0 +1,61 @@
+import os.path
+import sys
+bigfiles_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bigfiles')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cPickle
+
+from tausch import *
+from wire import *
+import keccak
+import damgaardjurik as dj
+
+num_users = 16
+seed = ''
+
+def object_size(obj):
+    """Approximate the memory used by obj and the attributes it owns (not
+    shared objects such as its key)
+    """
+    retval = sys.getsizeof(obj)
+    attributes = getattr(obj, '__dict__', None)
+    if attributes is not None:
+        retval += sys.getsizeof(attributes)
+        for name, value in attributes.iteritems():
+            if not isinstance(value, dj.DamgaardJurik):
+                retval += sys.getsizeof(value)
+    return retval
+
+def benchmark(users, random):
+    """Return the bytes per selector held as DamgaardJurikCiphertext objects,
+    held in a TauschRouter's table, pickled, and packed by wire.pack_selectors
+    """
+    router = TauschRouter()
+    subscriptions = dict()
+    for user in users:
+        router.add_user(user, lambda add_del, user: None)
+    for me in users:
+        subscriptions[me] = dict( (user, me.encrypt(dj.DamgaardJurikPlaintext(0), random=random))
+                                  for user in users )
+        router.update_subscription(me, subscriptions[me])
+    selectors = len(users)**2
+    objects = sum( object_size(selector)
+                   for subscription in subscriptions.itervalues()
+                   for selector in subscription.itervalues() )
+    table = sum( sys.getsizeof(row) + sum( sys.getsizeof(selector) for selector in row )
+                 for row in router.table.itervalues() )
+    pickled = sum( len(cPickle.dumps(subscription, -1))
+                   for subscription in subscriptions.itervalues() )
+    packed = sum( len(pack_selectors(me, subscription))
+                  for me, subscription in subscriptions.iteritems() )
+    return [ float(size) / selectors for size in [objects, table, pickled, packed] ]
+
+if __name__ == '__main__':
+    sample_keys = cPickle.Unpickler(open(os.path.join(bigfiles_path, 'sample_keys.pkl'),'rb')).load()
+    random = keccak.KeccakRandom(seed)
+    print 'bytes per selector with %d users' % num_users
+    print 'keylen %12s %12s %12s %12s' % ('objects', 'table', 'pickled', 'packed')
+    for (keylen, key_seed), users in sorted(sample_keys.iteritems()):
+        if key_seed != seed or len(users) < num_users:
+            continue
+        print '%6d ' % keylen + ' '.join('%12.1f' % size for size in benchmark(users[:num_users], random))
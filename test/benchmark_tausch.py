@@ -0,0 +1,117 @@
+import os.path
+import sys
+bigfiles_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bigfiles')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cPickle
+from time import time
+
+from tausch import *
+from multiexp import FixedBaseTable
+import keccak
+import damgaardjurik as dj
+
+num_userss = [16, 32, 64]
+rounds = 3
+seed = ''
+
+# precompute budgets for the 'fixedbase' backend, as fractions of the tables
+# needed to route between every pair of users
+budget_fractions = [0.25, 0.75, 1.0]
+
+def label(router_args):
+    if 'validation' in router_args:
+        return router_args['validation']
+    if 'budget_fraction' in router_args:
+        return '%s/%d%%' % (router_args['backend'], 100 * router_args['budget_fraction'])
+    return router_args['backend'] + ('/parallel' if router_args.get('parallel') else '')
+
+def working_set(users, message_bits=32):
+    """The approximate number of bytes of fixed-base tables needed to route
+    messages of message_bits bits between every pair of users
+    """
+    return len(users) * sum( FixedBaseTable(1, user.n**2).nbytes_for(message_bits)
+                             for user in users )
+
+def budget_router_argss(users):
+    """The router arguments that compare 'fixedbase' over and under its
+    precompute budget with the 'naive' and 'multiexp' backends
+    """
+    working = working_set(users)
+    return [ {'backend':'naive'}, {'backend':'multiexp'} ] \
+           + [ {'backend':'fixedbase', 'budget_fraction':fraction,
+                'precompute_budget':int(fraction * working) + 1}
+               for fraction in budget_fractions ]
+
+def make_router(users, subscriptions, router_args):
+    router = TauschRouter(**dict( (name, value) for name, value in router_args.iteritems()
+                                  if name != 'budget_fraction' ))
+    for user in users:
+        router.add_user(user, lambda add_del, user: None)
+    for user in users:
+        router.update_subscription(user, subscriptions[user])
+    return router
+
+def benchmark(users, router_argss, random, freeze_only=False):
+    """Time a round for each of router_argss, or only the per-round
+    bookkeeping and validation done by freeze_round if freeze_only is True
+    """
+    listen_to = list(users)
+    random.shuffle(listen_to)
+    subscriptions = dict( (me, dict( (user,
+                                      me.encrypt(dj.DamgaardJurikPlaintext(1 if user is listen else 0),
+                                                 random=random,
+                                                 ciphertext_args={'cache':False}))
+                                     for user in users ))
+                          for me, listen in zip(users, listen_to) )
+    messagess = [ dict( (user, random.getrandbits(32))
+                        for user in users )
+                  for _ in xrange(rounds) ]
+    retval = list()
+    for router_args in router_argss:
+        router = make_router(users, subscriptions, router_args)
+        # report the steady-state round time, after any precomputation has been done
+        best = None
+        for messages in messagess:
+            start = time()
+            for user, message in messages.iteritems():
+                router.queue_message(user, message)
+            if freeze_only:
+                start = time()
+                router.freeze_round()
+            else:
+                router.route_messages()
+            best = min(best, time() - start) if best is not None else time() - start
+        router.close()
+        retval.append(best)
+    return retval
+
+if __name__ == '__main__':
+    sample_keys = cPickle.Unpickler(open(os.path.join(bigfiles_path, 'sample_keys.pkl'),'rb')).load()
+    mode = sys.argv[1] if len(sys.argv) >= 2 else None
+    freeze_only = mode == 'validation'
+    if freeze_only:
+        router_argss = [ {'validation':validation}
+                         for validation in validation_levels ]
+    elif mode == 'budget':
+        # the budgets depend on the users, but the labels don't
+        router_argss = budget_router_argss([])
+    else:
+        router_argss = [ {'backend':backend, 'parallel':parallel}
+                         for backend in sorted(routing_backends.iterkeys())
+                         for parallel in [False, True] ]
+    random = keccak.KeccakRandom(seed)
+    print 'keylen users ' + ' '.join('%16s' % label(router_args) for router_args in router_argss) + ' speedup'
+    for (keylen, key_seed), users in sorted(sample_keys.iteritems()):
+        if key_seed != seed:
+            continue
+        for num_users in num_userss:
+            if len(users) < num_users:
+                print '%6d %5d skipped, only %d sample keys' % (keylen, num_users, len(users))
+                continue
+            if mode == 'budget':
+                router_argss = budget_router_argss(users[:num_users])
+            times = benchmark(users[:num_users], router_argss, random, freeze_only)
+            print '%6d %5d ' % (keylen, num_users) \
+                  + ' '.join('%15.6fs' % t for t in times) \
+                  + ' %6.2fx' % (max(times) / min(times))
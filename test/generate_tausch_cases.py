@@ -3,6 +3,7 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import cPickle
+import multiprocessing
 
 import damgaardjurik
 import keccak
@@ -12,17 +13,26 @@ seeds = ['', 'foo', 'bar', 'baz', 'qux', 'quux', 'corge', 'grault', 'garply', 'w
 keylens = [512, 768, 1024, 2048, 4096]
 max_users = 64
 
-users = dict()
+def generate(args):
+    """Generate the max_users keys for one keylen and seed. Each (keylen, seed)
+    pair has its own KeccakRandom, so they can be generated in parallel
+    without changing the output.
+    """
+    keylen, seed = args
+    random = keccak.KeccakRandom(seed)
+    return (keylen, seed), tuple( damgaardjurik.DamgaardJurik(keylen, random=random)
+                                  for _ in xrange(max_users) )
 
-for keylen in keylens:
-    for seed in seeds:
-        users[(keylen, seed)] = list()
-        random = keccak.KeccakRandom(seed)
-        for _ in xrange(max_users):
-            users[(keylen, seed)].append(damgaardjurik.DamgaardJurik(keylen, random=random))
-        users[(keylen, seed)] = tuple(users[(keylen, seed)])
-        print 'finished seed %s' % repr(seed)
-    print 'finished keylen %d' % keylen
+pool = multiprocessing.Pool()
+users = dict()
+# the largest keys take the longest, so start them first
+for (keylen, seed), keys in pool.imap_unordered(generate, [ (keylen, seed)
+                                                            for keylen in reversed(keylens)
+                                                            for seed in seeds ]):
+    users[(keylen, seed)] = keys
+    print 'finished keylen %d seed %s' % (keylen, repr(seed))
+pool.close()
+pool.join()
 
 f = open('test_keys.pkl','wb')
 p = cPickle.Pickler(f, -1)
@@ -0,0 +1,80 @@
+import os.path
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+import keccak
+from damgaardjurik import *
+from blinding import *
+from batch import *
+
+class BatchTest(unittest.TestCase):
+    longMessage = True
+    def __init__(self, keylen, count, batch_args={}, seed=''):
+        self.keylen = keylen
+        self.count = count
+        self.batch_args = batch_args
+        self.seed = seed
+        super(BatchTest, self).__init__()
+    def setUp(self):
+        self.random = keccak.KeccakRandom(self.seed)
+        self.key = DamgaardJurik(keylen=self.keylen, random=self.random)
+    def runTest(self):
+        plaintexts = [ self.random.getrandbits(self.keylen // 2) for _ in xrange(self.count) ]
+        batch_args = dict(self.batch_args)
+        if batch_args.get('pool'):
+            batch_args['pool'] = BlindingPool(self.key, depth=self.count // 2, background=False)
+            batch_args['pool'].fill()
+        ciphertexts = encrypt_many(self.key, plaintexts, random=self.random, **batch_args)
+        self.assertEqual(plaintexts, [ int(self.key.decrypt(ciphertext)) for ciphertext in ciphertexts ],
+                         'With keylen=%d, batch_args=%s, seed=%s, encrypt_many output did not decrypt to the plaintexts in order' \
+                           % (self.keylen, repr(self.batch_args), repr(self.seed)))
+        self.assertEqual(plaintexts, [ int(plaintext) for plaintext in
+                                       decrypt_many(self.key, ciphertexts, self.batch_args.get('processes')) ],
+                         'With keylen=%d, batch_args=%s, seed=%s, decrypt_many did not return the plaintexts in order' \
+                           % (self.keylen, repr(self.batch_args), repr(self.seed)))
+
+class SequentialBatchTest(BatchTest):
+    def runTest(self):
+        plaintexts = [ self.random.getrandbits(self.keylen // 2) for _ in xrange(self.count) ]
+        for s in [1, 2]:
+            random = keccak.KeccakRandom(self.seed)
+            modulus = self.key.n ** (s + 1)
+            expected = [ (pow(random.randrange(1, self.key.n), self.key.n ** s, modulus)
+                          * pow(1 + self.key.n, plaintext, modulus)) % modulus
+                         for plaintext in plaintexts ]
+            self.assertEqual(expected, [ int(ciphertext) for ciphertext in
+                                         encrypt_many(self.key, plaintexts, s=s, random=keccak.KeccakRandom(self.seed)) ],
+                             'With keylen=%d, seed=%s, s=%d, sequential encrypt_many did not blind each plaintext with r**(n**s) for r drawn in order' \
+                               % (self.keylen, repr(self.seed), s))
+            self.assertEqual([ len(blinding_factors(self.key, count, s, random)) for count in [0, 1, 3] ], [0, 1, 3],
+                             'With keylen=%d, seed=%s, s=%d, blinding_factors returned the wrong number of factors' \
+                               % (self.keylen, repr(self.seed), s))
+        outputs = [ [ int(ciphertext) for ciphertext in
+                      encrypt_many(self.key, plaintexts, random=keccak.KeccakRandom(self.seed), processes=2) ]
+                    for _ in xrange(2) ]
+        self.assertEqual(outputs[0], outputs[1],
+                         'With keylen=%d, seed=%s, parallel encrypt_many with the same KeccakRandom seed was not reproducible' \
+                           % (self.keylen, repr(self.seed)))
+
+class MismatchedPoolBatchTest(BatchTest):
+    def runTest(self):
+        other_key = DamgaardJurik(keylen=self.keylen, random=self.random)
+        for pool_key, pool_s, s in [ (self.key, 2, 1), (self.key, 1, 2), (other_key, 1, 1) ]:
+            pool = BlindingPool(pool_key, s=pool_s, depth=1, low_water=0, background=False)
+            pool.fill()
+            with self.assertRaises(ValueError):
+                encrypt_many(self.key, range(self.count), s=s, pool=pool)
+
+if __name__ == '__main__':
+    keylengths = [512, 768, 1024]
+    batch_argss = [ {}, {'s':2}, {'bigint':'python'}, {'pool':True}, {'processes':2}, {'processes':0} ]
+    all_tests = unittest.TestSuite([ BatchTest(keylen, 32, batch_args)
+                                     for keylen in keylengths
+                                     for batch_args in batch_argss ]
+                                   + [ SequentialBatchTest(keylen, 16)
+                                       for keylen in keylengths ]
+                                   + [ MismatchedPoolBatchTest(keylen, 4)
+                                       for keylen in keylengths ])
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
@@ -0,0 +1,86 @@
+import os.path
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+from time import sleep, time
+
+import keccak
+from damgaardjurik import *
+from blinding import *
+
+class BlindingPoolTest(unittest.TestCase):
+    longMessage = True
+    def __init__(self, keylen, count, pool_args={}, seed=''):
+        self.keylen = keylen
+        self.count = count
+        self.pool_args = pool_args
+        self.seed = seed
+        super(BlindingPoolTest, self).__init__()
+    def setUp(self):
+        self.random = keccak.KeccakRandom(self.seed)
+        self.key = DamgaardJurik(keylen=self.keylen, random=self.random)
+        self.pool = BlindingPool(self.key, depth=self.count // 2, low_water=self.count // 4, **self.pool_args)
+    def tearDown(self):
+        self.pool.close()
+    def runTest(self):
+        if not self.pool_args.get('background', True):
+            self.pool.fill()
+        # the pool runs dry partway through, so both paths of encrypt are taken
+        for _ in xrange(self.count):
+            i = self.random.getrandbits(self.keylen // 2)
+            self.assertEqual(i, self.key.decrypt(self.pool.encrypt(DamgaardJurikPlaintext(i))),
+                             'With keylen=%d, pool_args=%s, seed=%s, pooled encryption did not decrypt to the plaintext' \
+                               % (self.keylen, repr(self.pool_args), repr(self.seed)))
+
+class DistinctBlindingPoolTest(BlindingPoolTest):
+    def runTest(self):
+        # the pool is filled by several worker processes, which must not
+        # share the state of their randomness
+        blindings = list()
+        deadline = time() + 600
+        while len(blindings) < self.count and time() < deadline:
+            blinding = self.pool.take()
+            if blinding is None:
+                sleep(0.01)
+            else:
+                blindings.append(int(blinding))
+        self.assertEqual(len(blindings), self.count,
+                         'With keylen=%d, pool_args=%s, seed=%s, the pool did not refill' \
+                           % (self.keylen, repr(self.pool_args), repr(self.seed)))
+        self.assertEqual(len(set(blindings)), len(blindings),
+                         'With keylen=%d, pool_args=%s, seed=%s, the pool produced the same encryption of zero twice' \
+                           % (self.keylen, repr(self.pool_args), repr(self.seed)))
+
+class DeterministicBlindingPoolTest(unittest.TestCase):
+    longMessage = True
+    def __init__(self, keylen, count, seed=''):
+        self.keylen = keylen
+        self.count = count
+        self.seed = seed
+        super(DeterministicBlindingPoolTest, self).__init__()
+    def runTest(self):
+        key = DamgaardJurik(keylen=self.keylen, random=keccak.KeccakRandom(self.seed))
+        ciphertextss = list()
+        for _ in xrange(2):
+            pool = BlindingPool(key, depth=self.count // 2, low_water=0,
+                                random=keccak.KeccakRandom(self.seed), background=False)
+            pool.fill()
+            ciphertextss.append([ int(pool.encrypt(i)) for i in xrange(self.count) ])
+        self.assertEqual(ciphertextss[0], ciphertextss[1],
+                         'With keylen=%d, seed=%s, pools with the same KeccakRandom seed produced different ciphertexts' \
+                           % (self.keylen, repr(self.seed)))
+
+if __name__ == '__main__':
+    keylengths = [512, 768, 1024]
+    pool_argss = [ {'background':False}, {}, {'processes':2} ]
+    all_tests = unittest.TestSuite([ BlindingPoolTest(keylen, 32, pool_args)
+                                     for keylen in keylengths
+                                     for pool_args in pool_argss ]
+                                   + [ DistinctBlindingPoolTest(keylen, 32, pool_args)
+                                       for keylen in keylengths
+                                       for pool_args in [ {'processes':2},
+                                                          {'processes':2, 'random':keccak.KeccakRandom('blinding')} ] ]
+                                   + [ DeterministicBlindingPoolTest(keylen, 16)
+                                       for keylen in keylengths ])
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
@@ -0,0 +1,75 @@
+import os.path
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+import keccak
+from damgaardjurik import *
+from bigint import *
+from djcontext import *
+
+class CiphertextContextTest(unittest.TestCase):
+    longMessage = True
+    def __init__(self, keylen, count, seed=''):
+        self.keylen = keylen
+        self.count = count
+        self.seed = seed
+        super(CiphertextContextTest, self).__init__()
+    def setUp(self):
+        self.random = keccak.KeccakRandom(self.seed)
+        self.key = DamgaardJurik(keylen=self.keylen, random=self.random)
+    def runTest(self):
+        for s in [1, 2, 3]:
+            self.assertIs(get_context(self.key.n, s), get_context(self.key.n, s),
+                          'With keylen=%d, s=%d, seed=%s, contexts were not shared' \
+                            % (self.keylen, s, repr(self.seed)))
+            for backend in sorted(bigint_backends.iterkeys()):
+                for _ in xrange(self.count):
+                    a, b = [ self.random.getrandbits(self.keylen // 2) for _ in xrange(2) ]
+                    k = self.random.getrandbits(16) - 2**15
+                    ca, cb = [ int(self.key.encrypt(DamgaardJurikPlaintext(i), s=s, random=self.random))
+                               for i in [a, b] ]
+                    context = context_for(self.key.n, [ca, cb], backend)
+                    self.assertEqual(context.s, s,
+                                     'With keylen=%d, s=%d, backend=%s, seed=%s, context_for chose the wrong s' \
+                                       % (self.keylen, s, backend, repr(self.seed)))
+                    for result, expected, operation in [ (context.add(ca, cb), a + b, 'add'),
+                                                         (context.negate(ca), -a, 'negate'),
+                                                         (context.multiply(ca, k), a * k, 'multiply') ]:
+                        self.assertEqual(int(self.key.decrypt(DamgaardJurikCiphertext(result, self.key))), expected,
+                                         'With keylen=%d, s=%d, backend=%s, seed=%s, %s did not decrypt correctly' \
+                                           % (self.keylen, s, backend, repr(self.seed), operation))
+
+class MinimalSTest(CiphertextContextTest):
+    def runTest(self):
+        n = self.key.n
+        for bound, expected in [ (2, 1), (n // 2, 1), (n // 2 + 1, 2), (n, 2),
+                                 (n**2 // 2, 2), (n**2 // 2 + 1, 3) ]:
+            self.assertEqual(minimal_s(n, bound), expected,
+                             'With keylen=%d, seed=%s, minimal_s was wrong for bound=%d' \
+                               % (self.keylen, repr(self.seed), bound))
+        for _ in xrange(self.count):
+            message_bits = self.random.randint(1, 3 * self.keylen)
+            senders = self.random.randint(1, 256)
+            bound = routed_bound(message_bits, senders)
+            s = minimal_s(n, bound)
+            self.assertLess(senders * ((1 << message_bits) - 1), n**s // 2,
+                            'With keylen=%d, seed=%s, message_bits=%d, senders=%d, minimal_s was too small' \
+                              % (self.keylen, repr(self.seed), message_bits, senders))
+            a = (1 << message_bits) - 1
+            c = self.key.encrypt(DamgaardJurikPlaintext(a), s=s, random=self.random)
+            total = int(c)
+            context = context_for(n, [total])
+            for _ in xrange(senders - 1):
+                total = context.add(total, int(c))
+            self.assertEqual(int(self.key.decrypt(DamgaardJurikCiphertext(total, self.key))), a * senders,
+                             'With keylen=%d, seed=%s, message_bits=%d, senders=%d, the routed sum overflowed' \
+                               % (self.keylen, repr(self.seed), message_bits, senders))
+
+if __name__ == '__main__':
+    all_tests = unittest.TestSuite([ CiphertextContextTest(keylen, 8)
+                                     for keylen in [512, 768, 1024] ]
+                                   + [ MinimalSTest(keylen, 8)
+                                       for keylen in [512, 768, 1024] ])
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
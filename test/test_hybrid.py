@@ -0,0 +1,58 @@
+import os.path
+import sys
+bigfiles_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bigfiles')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import cPickle
+from cStringIO import StringIO
+
+from hybrid import *
+import keccak
+
+def split(random, data):
+    """Split data into randomly sized chunks"""
+    retval = list()
+    start = 0
+    while start < len(data):
+        end = random.randint(start, min(len(data), start + 4096))
+        retval.append(data[start:end])
+        start = end
+    return retval
+
+class HybridTest(unittest.TestCase):
+    longMessage = True
+    def __init__(self, keylen, seed, key):
+        self.keylen = keylen
+        self.seed = seed
+        self.key = key
+        super(HybridTest, self).__init__()
+    def setUp(self):
+        self.random = keccak.KeccakRandom(self.seed)
+    def runTest(self):
+        for length in [0, 1, 100, 2**16 + 3]:
+            payload = ''.join( chr(self.random.getrandbits(8)) for _ in xrange(length) )
+            encrypted = ''.join(encrypt_stream(self.key, split(self.random, payload), random=self.random))
+            self.assertEqual(''.join(decrypt_stream(self.key, split(self.random, encrypted))), payload,
+                             'With keylen=%d, seed=%s, length=%d, payload was not identical after an encryption/decryption round' \
+                               % (self.keylen, repr(self.seed), length))
+
+            outfile = StringIO()
+            decrypt_file(self.key, StringIO(encrypted), outfile, chunk_size=1000)
+            self.assertEqual(outfile.getvalue(), payload,
+                             'With keylen=%d, seed=%s, length=%d, decrypt_file did not recover the payload' \
+                               % (self.keylen, repr(self.seed), length))
+
+            changed_byte = self.random.randint(0, len(encrypted) - 1)
+            tampered = encrypted[:changed_byte] \
+                       + chr(self.random.randint(1, 255) ^ ord(encrypted[changed_byte])) \
+                       + encrypted[changed_byte+1:]
+            with self.assertRaises(ValueError):
+                ''.join(decrypt_stream(self.key, split(self.random, tampered)))
+
+if __name__ == '__main__':
+    sample_keys = cPickle.Unpickler(open(os.path.join(bigfiles_path, 'sample_keys.pkl'),'rb')).load()
+    all_tests = unittest.TestSuite([ HybridTest(keylen, seed, users[0])
+                                     for (keylen, seed), users in sample_keys.iteritems()
+                                     if seed == '' ])
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
@@ -0,0 +1,169 @@
+import os.path
+import sys
+bigfiles_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bigfiles')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cPickle
+import unittest
+from binascii import hexlify, unhexlify
+
+import keccak
+import keccakf
+
+# ways of passing input other than str, all implementing the buffer protocol
+buffer_types = [ bytearray, buffer, lambda data: memoryview(bytearray(data)) ]
+
+# LaneKeccak against the Keccak test vectors
+class LaneKeccakTestCase(unittest.TestCase):
+    longMessage=True
+    def __init__(self, keccak_args, input_vector, output_vector):
+        self.keccak_args = keccak_args
+        self.input_vector = input_vector
+        self.output_vector = output_vector
+        super(LaneKeccakTestCase,self).__init__()
+    def runTest(self):
+        for fixed_out in [True, False]:
+            k = keccakf.LaneKeccak(r=self.keccak_args['r'],
+                                   c=self.keccak_args['c'],
+                                   fixed_out=fixed_out)
+            k.absorb(self.input_vector)
+            self.assertEqual(k.squeeze(self.keccak_args['n']), self.output_vector,
+                             'input: %s\nparameters r=%d, c=%d, n=%d, fixed_out=%s' \
+                               % (repr(hexlify(self.input_vector)),
+                                  self.keccak_args['r'],
+                                  self.keccak_args['c'],
+                                  self.keccak_args['n'],
+                                  fixed_out))
+
+# hash_many against the same vectors, all inputs at once
+class HashManyTestCase(unittest.TestCase):
+    longMessage=True
+    def __init__(self, keccak_args, input_vectors, output_vectors):
+        self.keccak_args = keccak_args
+        self.input_vectors = input_vectors
+        self.output_vectors = output_vectors
+        super(HashManyTestCase,self).__init__()
+    def runTest(self):
+        digests = keccakf.hash_many(self.input_vectors, **self.keccak_args)
+        for input_vector, output_vector, digest in zip(self.input_vectors, self.output_vectors, digests):
+            self.assertEqual(digest, output_vector,
+                             'input: %s\nparameters r=%d, c=%d, n=%d' \
+                               % (repr(hexlify(input_vector)),
+                                  self.keccak_args['r'],
+                                  self.keccak_args['c'],
+                                  self.keccak_args['n']))
+
+def vector_tests(args, vectors):
+    """Build the LaneKeccak (and hash_many) tests for the vectors of each of
+    args that use Keccak-f[1600]
+    """
+    tests = list()
+    for i, keccak_args in enumerate(args):
+        if keccak_args['r'] + keccak_args['c'] != 1600:
+            continue
+        input_vectors = [ input_vector for input_vector, output_vectors in vectors ]
+        output_vectors = [ output_vectors[i] for input_vector, output_vectors in vectors ]
+        tests += [ LaneKeccakTestCase(keccak_args, input_vector, output_vector)
+                   for input_vector, output_vector in zip(input_vectors, output_vectors) ]
+        if keccakf.has_numpy:
+            tests.append(HashManyTestCase(keccak_args, input_vectors, output_vectors))
+    return tests
+
+
+
+########## Non-SHA3 Keccak ##########
+args = ({'r':  40, 'c':160, 'n': 20},
+        {'r': 128, 'c':272, 'n': 34},
+        {'r': 144, 'c':256, 'n': 32},
+        {'r': 256, 'c':544, 'n': 68},
+        {'r': 512, 'c':288, 'n': 64},
+        {'r': 544, 'c':256, 'n': 68},
+        {'r':1344, 'c':256, 'n':512})
+
+p = cPickle.Unpickler(open(os.path.join(bigfiles_path, 'nonstandard_vectors.pkl'),'rb'))
+ns_tests = unittest.TestSuite(vector_tests(args, p.load()))
+
+
+
+########## SHA3 Keccak and Keccak[] ##########
+args = ({'r':1024, 'c': 576, 'n':512}, # Keccak[]
+        {'r':1152, 'c': 448, 'n': 28}, # SHA3-224
+        {'r':1088, 'c': 512, 'n': 32}, # SHA3-256
+        {'r': 832, 'c': 768, 'n': 48}, # SHA3-384
+        {'r': 576, 'c':1024, 'n': 64}) # SHA3-512
+
+p = cPickle.Unpickler(open(os.path.join(bigfiles_path, 'vectors.pkl'),'rb'))
+s_tests = unittest.TestSuite(vector_tests(args, p.load()))
+
+empty_outputs = ({'r':1152, 'c':448, 'n':28},
+                 'F71837502BA8E10837BDD8D365ADB85591895602FC552B48B7390ABD'), \
+                ({'r':1088, 'c':512, 'n':32},
+                 'C5D2460186F7233C927E7DB2DCC703C0E500B653CA82273B7BFAD8045D85A470')
+
+empty_tests = unittest.TestSuite(LaneKeccakTestCase(keccak_args, '', unhexlify(output_vector))
+                                 for keccak_args, output_vector in empty_outputs)
+
+
+
+########## LaneKeccak against keccak.Keccak ##########
+class ReferenceKeccakTestCase(unittest.TestCase):
+    longMessage=True
+    def __init__(self, length, keccak_args, seed=''):
+        self.length = length
+        self.keccak_args = keccak_args
+        self.seed = seed
+        super(ReferenceKeccakTestCase,self).__init__()
+    def setUp(self):
+        self.random = keccak.KeccakRandom(self.seed)
+        self.data = ''.join( chr(self.random.getrandbits(8)) for _ in xrange(self.length) )
+    def runTest(self):
+        # several blocks of output, to check squeezing carries on the stream
+        n = 3 * self.keccak_args['r'] // 8 + 5
+        k = keccak.Keccak(r=self.keccak_args['r'], c=self.keccak_args['c'], fixed_out=False)
+        k.absorb(self.data)
+        expected = k.squeeze(n)
+        for chunk in [1, 7, 1000, max(self.length, 1)]:
+            k = keccakf.LaneKeccak(r=self.keccak_args['r'], c=self.keccak_args['c'])
+            for offset in xrange(0, self.length, chunk):
+                k.absorb(self.data[offset:offset+chunk])
+            output = ''.join( k.squeeze(part) for part in [1, n//2, n - n//2 - 1] )
+            self.assertEqual(output, expected,
+                             'With length=%d, keccak_args=%s, chunk=%d, output did not match keccak.Keccak' \
+                               % (self.length, repr(self.keccak_args), chunk))
+            for buffer_type in buffer_types:
+                k = keccakf.LaneKeccak(r=self.keccak_args['r'], c=self.keccak_args['c'])
+                for offset in xrange(0, self.length, chunk):
+                    k.absorb(buffer_type(self.data[offset:offset+chunk]))
+                self.assertEqual(k.squeeze(n), expected,
+                                 'With length=%d, keccak_args=%s, chunk=%d, output from %s input did not match keccak.Keccak' \
+                                   % (self.length, repr(self.keccak_args), chunk,
+                                      type(buffer_type(self.data)).__name__))
+        with self.assertRaises(RuntimeError):
+            k.absorb('x')
+
+reference_tests = unittest.TestSuite(ReferenceKeccakTestCase(length, keccak_args)
+                                     for length in [0, 1, 71, 72, 135, 136, 137, 1000]
+                                     for keccak_args in [ {'r':1088, 'c':512},
+                                                          {'r':576, 'c':1024},
+                                                          {'r':1344, 'c':256} ])
+
+
+
+########## Engine selection ##########
+class EngineTestCase(unittest.TestCase):
+    def runTest(self):
+        self.assertIs(keccakf.get_engine('lanes'), keccakf.LaneKeccak)
+        self.assertIs(keccakf.get_engine('reference'), keccak.Keccak)
+        with self.assertRaises(ValueError):
+            keccakf.get_engine('nonexistent')
+        with self.assertRaises(ValueError):
+            keccakf.LaneKeccak(r=40, c=160)
+        # widths other than 1600 fall back to the reference implementation
+        self.assertIsInstance(keccakf.new(r=40, c=160, engine='lanes'), keccak.Keccak)
+        self.assertIsInstance(keccakf.new(r=1088, c=512, engine='lanes'), keccakf.LaneKeccak)
+
+engine_tests = unittest.TestSuite([EngineTestCase()])
+
+if __name__ == '__main__':
+    all_tests = unittest.TestSuite([ns_tests, s_tests, empty_tests, reference_tests, engine_tests])
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
@@ -0,0 +1,71 @@
+import os.path
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import unittest
+import tempfile
+from cStringIO import StringIO
+
+import keccak
+import keccakf
+from keccakfile import *
+
+class KeccakFileTest(unittest.TestCase):
+    longMessage = True
+    def __init__(self, length, seed=''):
+        self.length = length
+        self.seed = seed
+        super(KeccakFileTest, self).__init__()
+    def setUp(self):
+        self.random = keccak.KeccakRandom(self.seed)
+        self.data = ''.join( chr(self.random.getrandbits(8)) for _ in xrange(self.length) )
+        self.file = tempfile.NamedTemporaryFile()
+        self.file.write(self.data)
+        self.file.flush()
+    def tearDown(self):
+        self.file.close()
+    def runTest(self):
+        for r, c, n in [(1088, 512, 32), (576, 1024, 64), (40, 160, 20)]:
+            k = keccak.Keccak(r=r, c=c, fixed_out=True)
+            k.absorb(self.data)
+            expected = k.squeeze(n)
+            for source in [StringIO(self.data), self.file.name]:
+                for chunk_size in [1, 1000, 2**20]:
+                    self.assertEqual(hash_file(source, r, c, n, chunk_size), expected,
+                                     'With length=%d, r=%d, c=%d, chunk_size=%d, hash_file did not match Keccak' \
+                                       % (self.length, r, c, chunk_size))
+                    if not isinstance(source, basestring):
+                        source.seek(0)
+            for engine in sorted(keccakf.keccak_engines):
+                # io.BytesIO can't be memory mapped, so it is read into a reused buffer
+                for source in [io.BytesIO(self.data), self.file.name]:
+                    for chunk_size in [1, 1000, 2**20]:
+                        self.assertEqual(hash_file(source, r, c, n, chunk_size, engine=engine), expected,
+                                         'With length=%d, r=%d, c=%d, chunk_size=%d, engine=%s, hash_file did not match Keccak' \
+                                           % (self.length, r, c, chunk_size, engine))
+                        if not isinstance(source, basestring):
+                            source.seek(0)
+
+        key = 'k' * 32
+        for chunk_size in [1, 1000, 2**20]:
+            encrypted = StringIO()
+            encrypt_file(key, self.file.name, encrypted, random=self.random, chunk_size=chunk_size)
+            encrypted = encrypted.getvalue()
+            decrypted = StringIO()
+            decrypt_file(key, StringIO(encrypted), decrypted, chunk_size=chunk_size)
+            self.assertEqual(decrypted.getvalue(), self.data,
+                             'With length=%d, chunk_size=%d, file was not identical after an encryption/decryption round' \
+                               % (self.length, chunk_size))
+
+            changed_byte = self.random.randint(0, len(encrypted) - 1)
+            tampered = encrypted[:changed_byte] \
+                       + chr(self.random.randint(1, 255) ^ ord(encrypted[changed_byte])) \
+                       + encrypted[changed_byte+1:]
+            with self.assertRaises(ValueError):
+                decrypt_file(key, StringIO(tampered), StringIO(), chunk_size=chunk_size)
+
+if __name__ == '__main__':
+    all_tests = unittest.TestSuite([ KeccakFileTest(length)
+                                     for length in [0, 1, 135, 136, 137, 5000] ])
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
@@ -0,0 +1,93 @@
+import os.path
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+import keccak
+from intbytes import int2bytes
+from keccakrandom import *
+
+class BufferedKeccakRandomTestCase(unittest.TestCase):
+    longMessage=True
+    def __init__(self, seed, blocks, *args, **kwargs):
+        self.seed = seed
+        self.blocks = blocks
+        super(BufferedKeccakRandomTestCase, self).__init__(*args, **kwargs)
+    def setUp(self):
+        self.unbuffered = keccak.KeccakRandom(self.seed)
+        self.buffered = BufferedKeccakRandom(self.seed, blocks=self.blocks)
+        self.r = self.unbuffered.k.r
+        # read sizes that cross the block and batch boundaries unaligned
+        self.widths = [1, 7, 8, 64, 3, self.r, 5, self.r * (self.blocks + 1) + 3, 100, 1, self.r - 1]
+    def describe(self, what):
+        return 'seed: %s, blocks=%d\n%s' % (repr(self.seed), self.blocks, what)
+    def test_getrandbits(self):
+        for width in self.widths * 3:
+            self.assertEqual(self.buffered.getrandbits(width), self.unbuffered.getrandbits(width),
+                             self.describe('getrandbits(%d) should match the unbuffered stream' % width))
+    def test_getrandbits_many(self):
+        for width in self.widths:
+            expected = [ self.unbuffered.getrandbits(width) for _ in xrange(50) ]
+            self.assertEqual(self.buffered.getrandbits_many(width, 50), expected,
+                             self.describe('getrandbits_many(%d, 50) should match the unbuffered stream' % width))
+    def test_randrange(self):
+        # ranges this wide are drawn with getrandbits rather than random()
+        for stop in [2**53 + 1, 2**100 + 1] * 20:
+            self.assertEqual(self.buffered.randrange(stop), self.unbuffered.randrange(stop),
+                             self.describe('randrange(%d) should match the unbuffered stream' % stop))
+        for stop in [2, 3, 1000]:
+            self.assertTrue(0 <= self.buffered.randrange(stop) < stop,
+                            self.describe('randrange(%d) should be in range' % stop))
+    def test_random(self):
+        for _ in xrange(20):
+            self.assertEqual(self.buffered.random(), self.unbuffered.getrandbits(53) * 2.0**-53,
+                             self.describe('random() should be made from 53 bits of the unbuffered stream'))
+    def test_randbytes(self):
+        for n in [0, 1, 5, 200]:
+            expected = int2bytes(self.unbuffered.getrandbits(8 * n), n)[::-1] if n else ''
+            self.assertEqual(self.buffered.randbytes(n), expected,
+                             self.describe('randbytes(%d) should match the unbuffered stream' % n))
+    def test_setstate(self):
+        self.buffered.getrandbits(self.r // 3)
+        state = self.buffered.getstate()
+        other = BufferedKeccakRandom('\x00', blocks=self.blocks)
+        other.setstate(state)
+        self.assertEqual(self.buffered.getrandbits_many(self.r, 2 * self.blocks),
+                         other.getrandbits_many(self.r, 2 * self.blocks),
+                         self.describe('output should be the same if set to an unaligned intermediate state'))
+    def test_from_state(self):
+        self.buffered.getrandbits(self.r // 3)
+        other = BufferedKeccakRandom.from_state(self.buffered.getstate())
+        self.assertEqual(self.buffered.getrandbits_many(self.r, 2 * self.blocks),
+                         other.getrandbits_many(self.r, 2 * self.blocks),
+                         self.describe('output should be the same if initialized from an unaligned intermediate state'))
+    def test_jumpahead(self):
+        for before, n in [(0, 4), (2, 1), (1, 3 * self.blocks + 1)]:
+            self.buffered.getrandbits_many(self.r, before)
+            for _ in xrange(before + n):
+                self.unbuffered.getrandbits(self.r)
+            self.buffered.jumpahead(n)
+            self.assertEqual(self.buffered.getrandbits(self.r), self.unbuffered.getrandbits(self.r),
+                             self.describe('output should be the same when using jumpahead(%d) vs getrandbits' % n))
+    def test_seed(self):
+        self.buffered.getrandbits(self.r // 3)
+        self.buffered.seed(self.seed)
+        self.assertEqual(self.buffered.getrandbits(self.r * 2),
+                         keccak.KeccakRandom(self.seed).getrandbits(self.r * 2),
+                         self.describe('output should start over when reseeded'))
+
+class BufferedKeccakRandomTestSeed(unittest.TestSuite):
+    def __init__(self, seed, blocks):
+        super(BufferedKeccakRandomTestSeed, self).__init__()
+        test_methods = [ name
+                         for name in BufferedKeccakRandomTestCase.__dict__.iterkeys()
+                         if name.startswith('test_') ]
+        for method in test_methods:
+            self.addTest(BufferedKeccakRandomTestCase(seed, blocks, method))
+
+if __name__ == '__main__':
+    all_tests = unittest.TestSuite(BufferedKeccakRandomTestSeed(seed, blocks)
+                                   for seed in [ '', 'foo', 'bar', 'baz' ]
+                                   for blocks in [1, default_blocks])
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
@@ -0,0 +1,84 @@
+import os.path
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import unittest
+import tempfile
+
+import keccak
+from intbytes import int2bytes
+from keccaktree import *
+from keccakfile import tree_hash_file
+
+class KeccakTreeTest(unittest.TestCase):
+    longMessage = True
+    def __init__(self, length, tree_args, seed=''):
+        self.length = length
+        self.tree_args = tree_args
+        self.seed = seed
+        super(KeccakTreeTest, self).__init__()
+    def setUp(self):
+        self.random = keccak.KeccakRandom(self.seed)
+        self.data = ''.join( chr(self.random.getrandbits(8)) for _ in xrange(self.length) )
+    def digest(self, processes, chunk, engine=None, buffer_type=str):
+        tree = KeccakTree(processes=processes, engine=engine, **self.tree_args)
+        for offset in xrange(0, len(self.data), chunk):
+            tree.absorb(buffer_type(self.data[offset:offset+chunk]))
+        return tree.squeeze(32)
+    def runTest(self):
+        expected = self.digest(None, max(self.length, 1))
+        for processes in [None, 2]:
+            for chunk in [1, 1000, 4096]:
+                self.assertEqual(self.digest(processes, chunk), expected,
+                                 'With length=%d, tree_args=%s, processes=%s, chunk=%d, digest depended on how it was computed' \
+                                   % (self.length, repr(self.tree_args), processes, chunk))
+        self.assertEqual(self.digest(2, 4096, engine='lanes'), expected,
+                         'With length=%d, tree_args=%s, digest depended on the Keccak engine' \
+                           % (self.length, repr(self.tree_args)))
+        for buffer_type in [bytearray, buffer, lambda data: memoryview(bytearray(data))]:
+            for processes in [None, 2]:
+                self.assertEqual(self.digest(processes, 1000, buffer_type=buffer_type), expected,
+                                 'With length=%d, tree_args=%s, processes=%s, digest of %s input did not match str input' \
+                                   % (self.length, repr(self.tree_args), processes,
+                                      type(buffer_type(self.data)).__name__))
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(self.data)
+            f.flush()
+            self.assertEqual(tree_hash_file(f.name, n=32, processes=2, **self.tree_args), expected,
+                             'With length=%d, tree_args=%s, tree_hash_file did not match KeccakTree' \
+                               % (self.length, repr(self.tree_args)))
+            f.seek(0)
+            self.assertEqual(tree_hash_file(io.BytesIO(f.read()), n=32, processes=None, chunk_size=1000,
+                                            **self.tree_args), expected,
+                             'With length=%d, tree_args=%s, tree_hash_file of an unmapped file did not match KeccakTree' \
+                               % (self.length, repr(self.tree_args)))
+
+        # a tree of one leaf is the root over that leaf's chaining value
+        if self.length <= self.tree_args['leaf_size']:
+            leaf = keccak.Keccak(r=1088, c=512, fixed_out=True)
+            leaf.absorb('\x00' + self.data)
+            root = keccak.Keccak(r=1088, c=512, fixed_out=True)
+            root.absorb('\x02' + ''.join(int2bytes(i, 8) for i in [self.tree_args['leaf_size'],
+                                                                    self.tree_args['fanout'],
+                                                                    self.length,
+                                                                    1]))
+            root.absorb(leaf.squeeze(32))
+            self.assertEqual(root.squeeze(32), expected,
+                             'With length=%d, tree_args=%s, single leaf digest was not built as specified' \
+                               % (self.length, repr(self.tree_args)))
+        other_args = dict(self.tree_args, leaf_size=self.tree_args['leaf_size'] * 2)
+        if self.length > self.tree_args['leaf_size']:
+            tree = KeccakTree(**other_args)
+            tree.absorb(self.data)
+            self.assertNotEqual(tree.squeeze(32), expected,
+                                'With length=%d, tree_args=%s, digest did not depend on leaf_size' \
+                                  % (self.length, repr(self.tree_args)))
+
+if __name__ == '__main__':
+    all_tests = unittest.TestSuite([ KeccakTreeTest(length, tree_args)
+                                     for length in [0, 1, 136, 5000, 40000]
+                                     for tree_args in [ {'leaf_size':136, 'fanout':2},
+                                                        {'leaf_size':1088, 'fanout':4},
+                                                        {'leaf_size':136 * 2**13, 'fanout':16} ] ])
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
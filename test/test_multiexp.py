@@ -0,0 +1,140 @@
+import os.path
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+import keccak
+from bigint import *
+from multiexp import *
+
+class MultiPowTest(unittest.TestCase):
+    longMessage = True
+    def __init__(self, modulus_bits, exponent_bits, count, seed=''):
+        self.modulus_bits = modulus_bits
+        self.exponent_bits = exponent_bits
+        self.count = count
+        self.seed = seed
+        super(MultiPowTest, self).__init__()
+    def setUp(self):
+        self.random = keccak.KeccakRandom(self.seed)
+    def runTest(self):
+        for num_bases in xrange(self.count):
+            modulus = self.random.getrandbits(self.modulus_bits) | (1 << (self.modulus_bits - 1)) | 1
+            bases = [ self.random.randrange(modulus) for _ in xrange(num_bases) ]
+            exponents = [ self.random.getrandbits(self.exponent_bits) for _ in xrange(num_bases) ]
+            expected = 1
+            for base, exponent in zip(bases, exponents):
+                expected = expected * pow(base, exponent, modulus) % modulus
+            for window in [None, 1, 2, 5]:
+                self.assertEqual(multi_pow(bases, exponents, modulus, window=window), expected,
+                                 'With modulus_bits=%d, exponent_bits=%d, num_bases=%d, window=%s, seed=%s, multi_pow did not match pow' \
+                                   % (self.modulus_bits, self.exponent_bits, num_bases, repr(window), repr(self.seed)))
+
+class NegativeMultiPowTest(MultiPowTest):
+    def runTest(self):
+        modulus = 2**self.modulus_bits - 1
+        for num_bases in xrange(1, self.count):
+            bases = list()
+            while len(bases) < num_bases:
+                base = self.random.randrange(modulus)
+                try: invert(base, modulus)
+                except ValueError: pass
+                else: bases.append(base)
+            exponents = [ self.random.getrandbits(self.exponent_bits) - (1 << (self.exponent_bits - 1))
+                          for _ in xrange(num_bases) ]
+            negative = multi_pow([ invert(base, modulus) if exponent < 0 else base
+                                   for base, exponent in zip(bases, exponents) ],
+                                 [ abs(exponent) for exponent in exponents ],
+                                 modulus)
+            self.assertEqual(multi_pow(bases, exponents, modulus), negative,
+                             'With modulus_bits=%d, exponent_bits=%d, num_bases=%d, seed=%s, negative exponents did not use the inverse' \
+                               % (self.modulus_bits, self.exponent_bits, num_bases, repr(self.seed)))
+            self.assertEqual(multi_pow(bases, exponents, modulus) * multi_pow(bases, [ -exponent for exponent in exponents ], modulus) % modulus, 1,
+                             'With modulus_bits=%d, exponent_bits=%d, num_bases=%d, seed=%s, negating the exponents did not invert the result' \
+                               % (self.modulus_bits, self.exponent_bits, num_bases, repr(self.seed)))
+
+class FixedBaseTest(MultiPowTest):
+    def runTest(self):
+        for num_bases in xrange(1, self.count):
+            modulus = self.random.getrandbits(self.modulus_bits) | (1 << (self.modulus_bits - 1)) | 1
+            cache = FixedBaseCache(budget=self.count // 2 * FixedBaseTable(modulus - 1, modulus).nbytes_for(self.exponent_bits))
+            bases = [ self.random.randrange(modulus) for _ in xrange(num_bases) ]
+            admitted = None
+            for _ in xrange(3):
+                exponents = [ self.random.getrandbits(self.exponent_bits) for _ in xrange(num_bases) ]
+                tables = [ cache.get(i, base, modulus, self.exponent_bits)
+                           for i, base in enumerate(bases) ]
+                for table, base, exponent in zip(tables, bases, exponents):
+                    if table is None:
+                        continue
+                    self.assertEqual(table.pow(exponent), pow(base, exponent, modulus),
+                                     'With modulus_bits=%d, exponent_bits=%d, seed=%s, FixedBaseTable.pow did not match pow' \
+                                       % (self.modulus_bits, self.exponent_bits, repr(self.seed)))
+                self.assertEqual(cache.multi_pow(xrange(num_bases), bases, exponents, modulus),
+                                 multi_pow(bases, exponents, modulus),
+                                 'With modulus_bits=%d, exponent_bits=%d, num_bases=%d, seed=%s, FixedBaseCache.multi_pow did not match multi_pow' \
+                                   % (self.modulus_bits, self.exponent_bits, num_bases, repr(self.seed)))
+                present = [ i for i, table in enumerate(tables) if table is not None ]
+                if present:
+                    self.assertEqual(fixed_multi_pow([ tables[i] for i in present ], [ exponents[i] for i in present ]),
+                                     multi_pow([ bases[i] for i in present ], [ exponents[i] for i in present ], modulus),
+                                     'With modulus_bits=%d, exponent_bits=%d, num_bases=%d, seed=%s, fixed_multi_pow did not match multi_pow' \
+                                       % (self.modulus_bits, self.exponent_bits, num_bases, repr(self.seed)))
+                self.assertLessEqual(cache.nbytes, cache.budget,
+                                     'With modulus_bits=%d, exponent_bits=%d, num_bases=%d, seed=%s, FixedBaseCache exceeded its budget' \
+                                       % (self.modulus_bits, self.exponent_bits, num_bases, repr(self.seed)))
+                # the same tables are used in the same order every time, so
+                # the ones that fit must stay rather than being evicted
+                if admitted is not None:
+                    self.assertEqual(present, admitted,
+                                     'With modulus_bits=%d, exponent_bits=%d, num_bases=%d, seed=%s, FixedBaseCache did not keep a stable set of tables' \
+                                       % (self.modulus_bits, self.exponent_bits, num_bases, repr(self.seed)))
+                admitted = present
+            self.assertEqual(len(admitted), min(num_bases, self.count // 2),
+                             'With modulus_bits=%d, exponent_bits=%d, num_bases=%d, seed=%s, FixedBaseCache did not fill its budget' \
+                               % (self.modulus_bits, self.exponent_bits, num_bases, repr(self.seed)))
+            cache.discard(lambda key: key % 2)
+            self.assertFalse(any(key % 2 for key in cache.tables),
+                             'With modulus_bits=%d, exponent_bits=%d, num_bases=%d, seed=%s, FixedBaseCache.discard did not drop matching tables' \
+                               % (self.modulus_bits, self.exponent_bits, num_bases, repr(self.seed)))
+
+class BackendTest(MultiPowTest):
+    def runTest(self):
+        modulus = 2**self.modulus_bits - 1
+        for num_bases in xrange(1, self.count):
+            bases = [ self.random.randrange(modulus) for _ in xrange(num_bases) ]
+            exponents = [ self.random.getrandbits(self.exponent_bits) - (1 << (self.exponent_bits - 1))
+                          for _ in xrange(num_bases) ]
+            try:
+                expected = multi_pow(bases, exponents, modulus, backend='python')
+            except ValueError:
+                continue
+            for backend in sorted(bigint_backends.iterkeys()):
+                result = multi_pow(bases, exponents, modulus, backend=backend)
+                self.assertTrue(type(result) in (int, long),
+                                'With backend=%s, multi_pow did not return a Python integer' % backend)
+                self.assertEqual(result, expected,
+                                 'With modulus_bits=%d, exponent_bits=%d, num_bases=%d, backend=%s, seed=%s, multi_pow differed from the python backend' \
+                                   % (self.modulus_bits, self.exponent_bits, num_bases, backend, repr(self.seed)))
+                tables = [ FixedBaseTable(base, modulus, backend=backend) for base in bases ]
+                self.assertEqual(fixed_multi_pow(tables, exponents), expected,
+                                 'With modulus_bits=%d, exponent_bits=%d, num_bases=%d, backend=%s, seed=%s, fixed_multi_pow differed from the python backend' \
+                                   % (self.modulus_bits, self.exponent_bits, num_bases, backend, repr(self.seed)))
+
+if __name__ == '__main__':
+    modulus_bitss = [64, 512, 2048]
+    exponent_bitss = [1, 8, 32, 256]
+    all_tests = unittest.TestSuite([ MultiPowTest(modulus_bits, exponent_bits, 16)
+                                     for modulus_bits in modulus_bitss
+                                     for exponent_bits in exponent_bitss ]
+                                   + [ NegativeMultiPowTest(modulus_bits, exponent_bits, 16)
+                                       for modulus_bits in modulus_bitss
+                                       for exponent_bits in exponent_bitss ]
+                                   + [ FixedBaseTest(modulus_bits, exponent_bits, 16)
+                                       for modulus_bits in modulus_bitss
+                                       for exponent_bits in exponent_bitss ]
+                                   + [ BackendTest(modulus_bits, exponent_bits, 16)
+                                       for modulus_bits in modulus_bitss
+                                       for exponent_bits in exponent_bitss ])
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
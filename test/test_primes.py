@@ -0,0 +1,75 @@
+import os.path
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+import keccak
+from bigint import *
+from primes import *
+
+def trial_division(n):
+    if n < 2:
+        return False
+    i = 2
+    while i * i <= n:
+        if n % i == 0:
+            return False
+        i += 1
+    return True
+
+class SieveTest(unittest.TestCase):
+    longMessage = True
+    def __init__(self, count, seed=''):
+        self.count = count
+        self.seed = seed
+        super(SieveTest, self).__init__()
+    def setUp(self):
+        self.random = keccak.KeccakRandom(self.seed)
+    def runTest(self):
+        for _ in xrange(self.count):
+            start = self.random.getrandbits(32) | (1 << 31) | 1
+            for safe in [False, True]:
+                for i, survived in enumerate(sieve(start, 256, safe)):
+                    candidate = start + 2*i
+                    has_small_factor = any( candidate % p == 0 or (safe and (2*candidate + 1) % p == 0)
+                                            for p in small_primes )
+                    self.assertEqual(bool(survived), not has_small_factor,
+                                     'With start=%d, safe=%s, seed=%s, sieve was wrong about %d' \
+                                       % (start, safe, repr(self.seed), candidate))
+        for n in xrange(2**16):
+            self.assertEqual(is_probable_prime(n), trial_division(n),
+                             'is_probable_prime was wrong about %d' % n)
+
+class RandomPrimeTest(unittest.TestCase):
+    longMessage = True
+    def __init__(self, bits, count, safe=False, seed=''):
+        self.bits = bits
+        self.count = count
+        self.safe = safe
+        self.seed = seed
+        super(RandomPrimeTest, self).__init__()
+    def runTest(self):
+        outputs = list()
+        for prime_args in [ {}, {'processes':2} ] + [ {'backend':backend} for backend in sorted(bigint_backends.iterkeys()) ]:
+            random = keccak.KeccakRandom(self.seed)
+            outputs.append([ random_prime(self.bits, random, self.safe, **prime_args) for _ in xrange(self.count) ])
+            for p in outputs[-1]:
+                self.assertEqual(p >> (self.bits - 2), 3,
+                                 'With bits=%d, safe=%s, prime_args=%s, seed=%s, top two bits were not set' \
+                                   % (self.bits, self.safe, repr(prime_args), repr(self.seed)))
+                self.assertTrue(is_probable_prime(p, rounds=64) and (not self.safe or is_probable_prime(p // 2, rounds=64)),
+                                'With bits=%d, safe=%s, prime_args=%s, seed=%s, %d was not a%s prime' \
+                                  % (self.bits, self.safe, repr(prime_args), repr(self.seed), p, ' safe' if self.safe else ''))
+        for output in outputs[1:]:
+            self.assertEqual(outputs[0], output,
+                             'With bits=%d, safe=%s, seed=%s, the primes depended on how they were searched for' \
+                               % (self.bits, self.safe, repr(self.seed)))
+
+if __name__ == '__main__':
+    all_tests = unittest.TestSuite([ SieveTest(16) ]
+                                   + [ RandomPrimeTest(bits, 4)
+                                       for bits in [32, 256, 512, 1024] ]
+                                   + [ RandomPrimeTest(bits, 2, safe=True)
+                                       for bits in [32, 256, 512] ])
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
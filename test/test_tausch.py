@@ -5,16 +5,23 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import unittest
 import cPickle
+import tempfile
+from cStringIO import StringIO
+from threading import Event, Thread
 
 from tausch import *
+from asynctausch import *
+from djcontext import minimal_s, routed_bound
+import djcontext
 import keccak
 import damgaardjurik as dj
 
 class BasicTauschRouterTest(unittest.TestCase):
     longMessage = True
-    def __init__(self, seed, users):
+    def __init__(self, seed, users, router_args={}):
         self.seed = seed
         self.users = list(users)
+        self.router_args = router_args
         super(BasicTauschRouterTest, self).__init__()
 
     def setUp(self):
@@ -23,7 +30,10 @@ class BasicTauschRouterTest(unittest.TestCase):
         temp = list(self.users)
         self.random.shuffle(temp)
         self.listen_map = dict(zip(self.users, temp))
-        self.router = TauschRouter()
+        self.router = TauschRouter(**self.router_args)
+
+    def tearDown(self):
+        self.router.close()
 
     @staticmethod
     def make_callback(me, listen_to, router, connected_users, random):
@@ -59,21 +69,480 @@ class BasicTauschRouterTest(unittest.TestCase):
         routed = self.router.route_messages()
         for user, message in routed.iteritems():
             expected_message = messages[self.listen_map[user]]
-            self.assertEqual(expected_message, user.decrypt(message)) # TODO: message
+            self.assertEqual(expected_message, user.decrypt(message),
+                             'With router_args=%s, routed message did not decrypt to the subscribed message' \
+                               % repr(self.router_args))
 
         removal_order = list(self.users)
         self.random.shuffle(removal_order)
         for user in removal_order:
             self.router.del_user(user)
 
+class DeltaTauschRouterTest(BasicTauschRouterTest):
+    @staticmethod
+    def make_callback(me, listen_to, router, connected_users, random):
+        def encrypt_selector(user):
+            return me.encrypt(dj.DamgaardJurikPlaintext(1 if user is listen_to else 0),
+                              random=random,
+                              ciphertext_args={'cache':False})
+        def callback(add_del, user):
+            if add_del == 'add':
+                if user is me:
+                    router.update_subscription(me, dict( (user, encrypt_selector(user))
+                                                         for user in router.users ))
+                else:
+                    # only the selector for the new user needs to be encrypted
+                    router.update_selectors(me, { user:encrypt_selector(user) })
+            elif add_del != 'del':
+                raise ValueError('Unknown operation')
+        return callback
+
+class MidRoundTauschRouterTest(BasicTauschRouterTest):
+    def runTest(self):
+        for user in self.users:
+            callback = self.make_callback(user, self.listen_map[user], self.router, self.router.users, self.random)
+            self.router.add_user(user, callback)
+
+        messages = dict( (user, self.random.getrandbits(32))
+                         for user in self.users )
+        half = len(self.users) // 2
+        for user in self.users[:half]:
+            self.router.queue_message(user, messages[user])
+
+        # a user that has already submitted leaves and rejoins in the middle of the round
+        if half:
+            churned = self.users[0]
+            self.router.del_user(churned)
+            callback = self.make_callback(churned, self.listen_map[churned], self.router, self.router.users, self.random)
+            self.router.add_user(churned, callback)
+            self.router.queue_message(churned, messages[churned])
+
+        for user in self.users[half:]:
+            self.router.queue_message(user, messages[user])
+
+        routed = self.router.route_messages()
+        self.assertEqual(frozenset(routed.iterkeys()), frozenset(self.users),
+                         'With router_args=%s, not every user received a message' % repr(self.router_args))
+        for user, message in routed.iteritems():
+            expected_message = messages[self.listen_map[user]]
+            self.assertEqual(expected_message, user.decrypt(message),
+                             'With router_args=%s, routed message did not decrypt to the subscribed message after a mid-round membership change' \
+                               % repr(self.router_args))
+
+class ChurnTauschRouterTest(BasicTauschRouterTest):
+    def runTest(self):
+        for user in self.users:
+            callback = self.make_callback(user, self.listen_map[user], self.router, self.router.users, self.random)
+            self.router.add_user(user, callback)
+
+        for round_number in xrange(4):
+            # a user leaves and rejoins between rounds, so that every row of
+            # selectors changes and the parallel workers must be kept up to date
+            if self.users and round_number % 2:
+                churned = self.random.choice(self.users)
+                self.router.del_user(churned)
+                callback = self.make_callback(churned, self.listen_map[churned], self.router, self.router.users, self.random)
+                self.router.add_user(churned, callback)
+
+            messages = dict( (user, self.random.getrandbits(32))
+                             for user in self.users )
+            for user, message in messages.iteritems():
+                self.router.queue_message(user, message)
+            routed = self.router.route_messages()
+            self.assertEqual(frozenset(routed.iterkeys()), frozenset(self.users),
+                             'With router_args=%s, not every user received a message in round %d' \
+                               % (repr(self.router_args), round_number))
+            for user, message in routed.iteritems():
+                expected_message = messages[self.listen_map[user]]
+                self.assertEqual(expected_message, user.decrypt(message),
+                                 'With router_args=%s, routed message did not decrypt to the subscribed message in round %d' \
+                                   % (repr(self.router_args), round_number))
+
+class PackedTauschRouterTest(BasicTauschRouterTest):
+    def runTest(self):
+        for user in self.users:
+            callback = self.make_callback(user, self.listen_map[user], self.router, self.router.users, self.random)
+            self.router.add_user(user, callback)
+
+        messages = dict( (user, tuple( self.random.getrandbits(self.router.slot_width)
+                                       for _ in xrange(self.router.slot_count) ))
+                         for user in self.users )
+        for user, message in messages.iteritems():
+            self.router.queue_message(user, message)
+
+        routed = self.router.route_messages()
+        for user, message in routed.iteritems():
+            expected_message = messages[self.listen_map[user]]
+            self.assertEqual(expected_message, self.router.unpack_slots(user.decrypt(message)),
+                             'With router_args=%s, routed slots did not decrypt to the subscribed slots' \
+                               % repr(self.router_args))
+class DoubleBufferedTauschRouterTest(BasicTauschRouterTest):
+    def runTest(self):
+        for user in self.users:
+            callback = self.make_callback(user, self.listen_map[user], self.router, self.router.users, self.random)
+            self.router.add_user(user, callback)
+
+        rounds = list()
+        for _ in xrange(2):
+            messages = dict( (user, self.random.getrandbits(32))
+                             for user in self.users )
+            for user, message in messages.iteritems():
+                self.router.queue_message(user, message)
+            rounds.append((messages, self.router.freeze_round()))
+        self.assertEqual([ frozen.epoch for _, frozen in rounds ], [0, 1],
+                         'With router_args=%s, frozen rounds did not have consecutive epochs' % repr(self.router_args))
+
+        # membership changes only take effect for rounds that haven't been frozen
+        if self.users:
+            self.router.del_user(self.users[0])
+
+        for messages, frozen in rounds:
+            routed = frozen.route()
+            self.assertEqual(frozenset(routed.iterkeys()), frozenset(self.users),
+                             'With router_args=%s, not every user received a message' % repr(self.router_args))
+            for user, message in routed.iteritems():
+                expected_message = messages[self.listen_map[user]]
+                self.assertEqual(expected_message, user.decrypt(message),
+                                 'With router_args=%s, routed message did not decrypt to the subscribed message in a frozen round' \
+                                   % repr(self.router_args))
+
+class IncompleteTauschRouterTest(BasicTauschRouterTest):
+    def runTest(self):
+        if not self.users:
+            return
+        for user in self.users:
+            self.router.add_user(user, lambda add_del, user: None)
+        for user in self.users:
+            self.router.queue_message(user, self.random.getrandbits(32))
+        with self.assertRaises(KeyError):
+            self.router.route_messages()
+
+class SnapshotTauschRouterTest(BasicTauschRouterTest):
+    def runTest(self):
+        for user in self.users:
+            callback = self.make_callback(user, self.listen_map[user], self.router, self.router.users, self.random)
+            self.router.add_user(user, callback)
+
+        messages = dict( (user, self.random.getrandbits(32))
+                         for user in self.users )
+        half = len(self.users) // 2
+        for user in self.users[:half]:
+            self.router.queue_message(user, messages[user])
+
+        snapshot = StringIO()
+        self.router.snapshot(snapshot)
+        snapshot = snapshot.getvalue()
+        snapshot_file = tempfile.NamedTemporaryFile()
+        snapshot_file.write(snapshot)
+        snapshot_file.flush()
+
+        callbacks = dict( (user, self.make_callback(user, self.listen_map[user], self.router, self.users, self.random))
+                          for user in self.users )
+        for source in [StringIO(snapshot), snapshot_file.name]:
+            restored = TauschRouter.restore(source, callbacks.__getitem__, **self.router_args)
+            self.addCleanup(restored.close)
+            if not self.router_args.get('incremental'):
+                self.assertFalse(any( row.decoded for row in restored.table.itervalues() ),
+                                 'With router_args=%s, selector rows were decoded before they were used' % repr(self.router_args))
+            restored._check_consistency()
+            resnapshot = StringIO()
+            restored.snapshot(resnapshot)
+            self.assertEqual(snapshot, resnapshot.getvalue(),
+                             'With router_args=%s, snapshot of the restored router was different' % repr(self.router_args))
+
+            for user in self.users[half:]:
+                restored.queue_message(user, messages[user])
+            routed = restored.route_messages()
+            for user, message in routed.iteritems():
+                expected_message = messages[self.listen_map[user]]
+                self.assertEqual(expected_message, user.decrypt(message),
+                                 'With router_args=%s, routed message did not decrypt to the subscribed message after restoring' \
+                                   % repr(self.router_args))
+        snapshot_file.close()
+
+class ParallelRestartTauschRouterTest(BasicTauschRouterTest):
+    # how long another thread holds the shared context lock, in seconds
+    hold = 60
+    def runTest(self):
+        self.assertIsNotNone(self.router.routing_pool.workers,
+                             'With router_args=%s, worker processes were not started with the router' % repr(self.router_args))
+        for user in self.users:
+            callback = self.make_callback(user, self.listen_map[user], self.router, self.router.users, self.random)
+            self.router.add_user(user, callback)
+
+        # restart the workers while another thread holds the context lock,
+        # which a forked worker inherits held
+        held = Event()
+        release = Event()
+        def hold_lock():
+            with djcontext._contexts_lock:
+                held.set()
+                release.wait()
+        holder = Thread(target=hold_lock)
+        holder.daemon = True
+        holder.start()
+        held.wait()
+        messages = dict( (user, self.random.getrandbits(32))
+                         for user in self.users )
+        outcome = dict()
+        def route():
+            try:
+                outcome['routed'] = self.router.route_messages()
+            except Exception as e:
+                outcome['error'] = e
+        try:
+            self.router.close()
+            for user, message in messages.iteritems():
+                self.router.queue_message(user, message)
+            routing = Thread(target=route)
+            routing.daemon = True
+            routing.start()
+            routing.join(self.hold)
+            stuck = routing.is_alive()
+            if stuck:
+                # the workers are deadlocked, so fail the round instead of hanging
+                for process, _ in list(self.router.routing_pool.workers or ()):
+                    process.terminate()
+                routing.join()
+        finally:
+            release.set()
+            holder.join()
+        self.assertFalse(stuck, 'With router_args=%s, restarted workers deadlocked on a lock held in the parent' \
+                                  % repr(self.router_args))
+        if 'error' in outcome:
+            raise outcome['error']
+        routed = outcome['routed']
+        for user, message in routed.iteritems():
+            expected_message = messages[self.listen_map[user]]
+            self.assertEqual(expected_message, user.decrypt(message),
+                             'With router_args=%s, routed message did not decrypt to the subscribed message after a restart' \
+                               % repr(self.router_args))
+
+class SelectorSizeTauschRouterTest(BasicTauschRouterTest):
+    def runTest(self):
+        if not self.users:
+            return
+        for user in self.users:
+            self.router.add_user(user, lambda add_del, user: None)
+        me = self.users[0]
+        s = self.router.required_s(me)
+        if s is None:
+            return
+        self.assertEqual(s, minimal_s(me.n, routed_bound(self.router.message_bits, len(self.users))),
+                         'With router_args=%s, required_s did not match the routed message bound' % repr(self.router_args))
+        def subscription(s):
+            return dict( (user, me.encrypt(dj.DamgaardJurikPlaintext(0), s=s, random=self.random))
+                         for user in self.users )
+        if s > 1:
+            with self.assertRaises(ValueError):
+                self.router.update_subscription(me, subscription(s - 1))
+        self.router.update_subscription(me, subscription(s))
+        with self.assertRaises(ValueError):
+            self.router.queue_message(me, 1 << self.router.message_bits)
+
+class PackedSelectorSizeTauschRouterTest(BasicTauschRouterTest):
+    def runTest(self):
+        if not self.users:
+            return
+        for user in self.users:
+            self.router.add_user(user, lambda add_del, user: None)
+        me = self.users[0]
+        limit = 1 << self.router.message_bits
+        # a slot value over message_bits would carry into the guard bits of
+        # its slot, even though the packed message is of a valid length
+        for position in xrange(self.router.slot_count):
+            values = [0] * self.router.slot_count
+            values[position] = limit
+            with self.assertRaises(ValueError):
+                self.router.queue_message(me, values)
+        self.router.queue_message(me, [limit - 1] * self.router.slot_count)
+
+class MaxUsersTauschRouterTest(BasicTauschRouterTest):
+    def runTest(self):
+        limit = self.router.max_users
+        for user in self.users[:limit]:
+            self.router.add_user(user, lambda add_del, user: None)
+        # the routed sums are only sized for max_users senders
+        for user in self.users[limit:]:
+            with self.assertRaises(RuntimeError):
+                self.router.add_user(user, lambda add_del, user: None)
+        self.assertEqual(self.router.users, frozenset(self.users[:limit]),
+                         'With router_args=%s, router admitted more than max_users users' % repr(self.router_args))
+
+class GrowingSelectorSizeTauschRouterTest(BasicTauschRouterTest):
+    def runTest(self):
+        if not self.users:
+            return
+        me = self.users[0]
+        self.router.add_user(me, lambda add_del, user: None)
+        s = self.router.required_s(me)
+        self.router.update_subscription(me, { me:me.encrypt(dj.DamgaardJurikPlaintext(1), s=s, random=self.random) })
+        # without max_users, the user whose joining outgrows the selector
+        # already given must be refused even if validation is off
+        for senders, user in enumerate(self.users[1:], 2):
+            if minimal_s(me.n, routed_bound(self.router.message_bits, senders)) > s:
+                with self.assertRaises(ValueError):
+                    self.router.add_user(user, lambda add_del, user: None)
+                self.assertNotIn(user, self.router.users,
+                                 'With router_args=%s, user was added although the routed sums could overflow' \
+                                   % repr(self.router_args))
+                return
+            self.router.add_user(user, lambda add_del, user: None)
+
+class AsyncTauschRouterTest(BasicTauschRouterTest):
+    deadline = None
+    def setUp(self):
+        super(AsyncTauschRouterTest, self).setUp()
+        self.router = AsyncTauschRouter(deadline=self.deadline, **self.router_args)
+    def tearDown(self):
+        self.router.close()
+    def runTest(self):
+        for user in self.users:
+            callback = self.make_callback(user, self.listen_map[user], self.router, self.router.users, self.random)
+            self.router.add_user(user, callback)
+        self.router.flush()
+
+        messages = dict( (user, self.random.getrandbits(32))
+                         for user in self.users )
+        absent = frozenset(self.users[:1]) if self.deadline is not None else frozenset()
+        futures = dict( (user, self.router.submit(user, message))
+                        for user, message in messages.iteritems()
+                        if user not in absent )
+        for user in absent:
+            messages[user] = 0
+
+        for user, future in futures.iteritems():
+            expected_message = messages[self.listen_map[user]]
+            self.assertEqual(expected_message, user.decrypt(future.result(timeout=600)),
+                             'With router_args=%s, deadline=%s, routed message did not decrypt to the subscribed message' \
+                               % (repr(self.router_args), repr(self.deadline)))
+
+class AsyncDeadlineTauschRouterTest(AsyncTauschRouterTest):
+    deadline = 1
+
+class AsyncPipelinedTauschRouterTest(AsyncTauschRouterTest):
+    rounds = 2
+    def runTest(self):
+        for user in self.users:
+            callback = self.make_callback(user, self.listen_map[user], self.router, self.router.users, self.random)
+            self.router.add_user(user, callback)
+        self.router.flush()
+
+        # every round is submitted straight away, without waiting for the
+        # previous ones to complete
+        rounds = list()
+        for _ in xrange(self.rounds):
+            messages = dict( (user, self.random.getrandbits(32))
+                             for user in self.users )
+            rounds.append((messages, dict( (user, self.router.submit(user, message))
+                                           for user, message in messages.iteritems() )))
+        for round_number, (messages, futures) in enumerate(rounds):
+            for user, future in futures.iteritems():
+                expected_message = messages[self.listen_map[user]]
+                self.assertEqual(expected_message, user.decrypt(future.result(timeout=600)),
+                                 'With router_args=%s, routed message did not decrypt to the subscribed message in pipelined round %d' \
+                                   % (repr(self.router_args), round_number))
+
+class AsyncDeepPipelinedTauschRouterTest(AsyncPipelinedTauschRouterTest):
+    # submissions for several rounds are held while the first is frozen
+    rounds = 4
+
+class CallbackError(Exception):
+    pass
+
+class AsyncCallbackErrorTauschRouterTest(AsyncTauschRouterTest):
+    def runTest(self):
+        if not self.users:
+            return
+        def failing_callback(add_del, user):
+            raise CallbackError()
+        for user in self.users[1:]:
+            callback = self.make_callback(user, self.listen_map[user], self.router, self.router.users, self.random)
+            self.router.add_user(user, callback)
+        self.router.add_user(self.users[0], failing_callback)
+        self.router.flush()
+
+        futures = [ self.router.submit(user, self.random.getrandbits(32))
+                    for user in self.users ]
+        for future in futures:
+            with self.assertRaises(CallbackError):
+                future.result(timeout=600)
+
+class AsyncDeletedTauschRouterTest(AsyncTauschRouterTest):
+    def runTest(self):
+        if not self.users:
+            return
+        for user in self.users:
+            callback = self.make_callback(user, self.listen_map[user], self.router, self.router.users, self.random)
+            self.router.add_user(user, callback)
+        self.router.flush()
+
+        # hold the worker thread, so the completed round waits to be frozen
+        # while one of its users is deleted
+        release = Event()
+        self.router.worker.apply_async(release.wait)
+        messages = dict( (user, self.random.getrandbits(32))
+                         for user in self.users )
+        futures = dict( (user, self.router.submit(user, message))
+                        for user, message in messages.iteritems() )
+        deleted = self.users[0]
+        self.router.del_user(deleted)
+        release.set()
+
+        with self.assertRaises(KeyError):
+            futures.pop(deleted).result(timeout=600)
+        messages[deleted] = 0
+        for user, future in futures.iteritems():
+            expected_message = messages[self.listen_map[user]]
+            self.assertEqual(expected_message, user.decrypt(future.result(timeout=600)),
+                             'With router_args=%s, routed message did not decrypt to the subscribed message after a deletion' \
+                               % repr(self.router_args))
 
 if __name__ == '__main__':
     sample_keys = cPickle.Unpickler(open(os.path.join(bigfiles_path, 'sample_keys.pkl'),'rb')).load()
     num_userss = [0, 1, 2, 3, 4, 8, 15, 16, 32]
     basic_tests = list()
+    router_argss = [ {'backend':backend, 'parallel':parallel}
+                     for backend in sorted(routing_backends.iterkeys())
+                     for parallel in [False, True] ]
+    router_argss += [ {'backend':backend, 'incremental':True}
+                      for backend in sorted(routing_backends.iterkeys()) ]
+    router_argss += [ {'validation':validation}
+                      for validation in validation_levels ]
     for (keylen, seed), users in sample_keys.iteritems():
         for num_users in num_userss:
-            basic_tests.append(BasicTauschRouterTest(seed, users[:num_users]))
+            for router_args in router_argss:
+                basic_tests.append(BasicTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(MidRoundTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(ChurnTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(DeltaTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(DoubleBufferedTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(IncompleteTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(SnapshotTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(SelectorSizeTauschRouterTest(seed, users[:num_users],
+                                                                 dict(router_args, message_bits=32)))
+                basic_tests.append(SelectorSizeTauschRouterTest(seed, users[:num_users],
+                                                                 dict(router_args, message_bits=keylen)))
+                if router_args.get('parallel'):
+                    basic_tests.append(ParallelRestartTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(MaxUsersTauschRouterTest(seed, users[:num_users],
+                                                            dict(router_args, message_bits=32,
+                                                                 max_users=max(num_users - 1, 1))))
+                basic_tests.append(GrowingSelectorSizeTauschRouterTest(seed, users[:num_users],
+                                                                       dict(router_args, message_bits=keylen - 2,
+                                                                            validation='off')))
+                basic_tests.append(AsyncTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(AsyncDeadlineTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(AsyncPipelinedTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(AsyncDeepPipelinedTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(AsyncCallbackErrorTauschRouterTest(seed, users[:num_users], router_args))
+                basic_tests.append(AsyncDeletedTauschRouterTest(seed, users[:num_users], router_args))
+                slot_args = { 'slot_width':32,
+                              'slot_count':(keylen - 2) // (32 + num_userss[-1].bit_length()),
+                              'max_users':num_userss[-1] }
+                basic_tests.append(PackedTauschRouterTest(seed, users[:num_users], dict(router_args, **slot_args)))
+                basic_tests.append(PackedSelectorSizeTauschRouterTest(seed, users[:num_users],
+                                                                      dict(router_args, message_bits=16, **slot_args)))
     basic_tests = unittest.TestSuite(basic_tests)
     unittest.TextTestRunner(verbosity=2).run(basic_tests)
             
@@ -0,0 +1,49 @@
+import os.path
+import sys
+bigfiles_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bigfiles')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import cPickle
+
+from wire import *
+import keccak
+import damgaardjurik as dj
+
+class PackSelectorsTest(unittest.TestCase):
+    longMessage = True
+    def __init__(self, seed, users):
+        self.seed = seed
+        self.users = list(users)
+        super(PackSelectorsTest, self).__init__()
+    def setUp(self):
+        self.random = keccak.KeccakRandom(self.seed)
+    def runTest(self):
+        for me in self.users:
+            selectors = dict( (user, me.encrypt(dj.DamgaardJurikPlaintext(self.random.getrandbits(32)),
+                                                s=self.random.randint(1, 3),
+                                                random=self.random))
+                              for user in self.users )
+            packed = pack_selectors(me, selectors)
+            self.assertLess(len(packed), len(cPickle.dumps(selectors, -1)),
+                            'With %d users, packed selectors were larger than pickled selectors' % len(self.users))
+            unpacked = unpack_selectors(me, packed, self.users)
+            self.assertEqual(frozenset(unpacked.iterkeys()), frozenset(selectors.iterkeys()),
+                             'With %d users, unpacked selectors had different senders' % len(self.users))
+            for user, selector in selectors.iteritems():
+                self.assertEqual(int(unpacked[user]), int(selector),
+                                 'With %d users, unpacked selector was different' % len(self.users))
+            others = [ user for user in self.users if user is not me ]
+            if others:
+                with self.assertRaises(ValueError):
+                    unpack_selectors(others[0], packed, self.users)
+                with self.assertRaises(KeyError):
+                    unpack_selectors(me, packed, others)
+
+if __name__ == '__main__':
+    sample_keys = cPickle.Unpickler(open(os.path.join(bigfiles_path, 'sample_keys.pkl'),'rb')).load()
+    all_tests = unittest.TestSuite([ PackSelectorsTest(seed, users[:num_users])
+                                     for (keylen, seed), users in sample_keys.iteritems()
+                                     if keylen <= 1024 and seed == ''
+                                     for num_users in [0, 1, 2, 8] ])
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
@@ -0,0 +1,70 @@
+from damgaardjurik import *
+from djcontext import context_for
+from intbytes import int2bytes, bytes2int
+import keccak
+
+fingerprint_length = 16
+selectors_magic = 'TSEL\x00\x01'
+# the length of the ciphertext width field
+selectors_width_width = 4
+
+def key_fingerprint(key):
+    """Return a short hash (fingerprint_length bytes) identifying a public key"""
+    k = keccak.Keccak(r=1088, c=512, fixed_out=True)
+    k.absorb(int2bytes(key.n, (key.n.bit_length() + 7) // 8))
+    return k.squeeze(fingerprint_length)
+
+def pack_selectors(recipient, selectors):
+    """Serialize a (partial) subscription, a dict DamgaardJurik ->
+    DamgaardJurikCiphertext of selectors under the recipient's key, to a
+    string for sending over the wire
+
+    Instead of pickling the ciphertext objects (and with them the keys), the
+    recipient and each sender are identified by their key fingerprints and
+    the selectors are written as fixed-width big-endian integers.
+    """
+    senders = list(selectors.iterkeys())
+    values = [ int(selectors[sender]) for sender in senders ]
+    width = context_for(recipient.n, values).width if values else 0
+    return ''.join([selectors_magic,
+                    key_fingerprint(recipient),
+                    int2bytes(width, selectors_width_width)]
+                   + [ key_fingerprint(sender) + int2bytes(value, width)
+                       for sender, value in zip(senders, values) ])
+
+def unpack_selectors(recipient, data, senders):
+    """Deserialize a string written by pack_selectors, returning the dict
+    DamgaardJurik -> DamgaardJurikCiphertext
+
+    recipient: the DamgaardJurik instance the selectors are for
+    data: the string written by pack_selectors
+    senders: an iterable of the DamgaardJurik instances that may appear as
+        senders, e.g. the users of a router
+    """
+    if data[:len(selectors_magic)] != selectors_magic:
+        raise ValueError('Not a packed subscription')
+    offset = len(selectors_magic)
+    if data[offset:offset+fingerprint_length] != key_fingerprint(recipient):
+        raise ValueError('Packed subscription is for a different recipient')
+    offset += fingerprint_length
+    width = bytes2int(data[offset:offset+selectors_width_width])
+    offset += selectors_width_width
+    if width:
+        entry_length = fingerprint_length + width
+        if (len(data) - offset) % entry_length:
+            raise ValueError('Corrupt packed subscription')
+    elif offset != len(data):
+        raise ValueError('Corrupt packed subscription')
+    senders = dict( (key_fingerprint(sender), sender) for sender in senders )
+    retval = dict()
+    while offset < len(data):
+        try:
+            sender = senders[data[offset:offset+fingerprint_length]]
+        except KeyError:
+            raise KeyError('Packed subscription has an unknown sender')
+        offset += fingerprint_length
+        retval[sender] = DamgaardJurikCiphertext(bytes2int(data[offset:offset+width]), recipient)
+        offset += width
+    return retval
+
+__all__ = ['key_fingerprint', 'pack_selectors', 'unpack_selectors']